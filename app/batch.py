@@ -0,0 +1,110 @@
+from __future__ import annotations
+from settings import config, errors
+from settings.logger import get_logger
+from app.gitflow import Gitflow
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import json
+import time
+import typing
+
+log = get_logger(__name__)
+
+_COMMANDS: dict[tuple[str, str], typing.Callable[[Gitflow, bool], None]] = {
+    ("release", "start"): lambda flow, resume: flow.start_release(),
+    ("release", "finish"): lambda flow, resume: flow.finish_release(resume=resume),
+    ("hotfix", "start"): lambda flow, resume: flow.start_hotfix(),
+    ("hotfix", "finish"): lambda flow, resume: flow.finish_hotfix(resume=resume),
+    ("support", "start"): lambda flow, resume: flow.start_support(),
+    ("support", "finish"): lambda flow, resume: flow.finish_support(resume=resume),
+}
+
+
+class Result:
+    def __init__(
+        self,
+        project: str,
+        seconds: float,
+        error: str | None = None,
+    ) -> None:
+        self.project = project
+        self.seconds = seconds
+        self.error = error
+
+
+def load_projects(path: str) -> list[dict[str, str]]:
+    """
+    Reads a JSON list of project paths, or of objects with a 'project' path
+    and an optional 'env' mapping that overrides env variables for it:
+    ["group/a", {"project": "group/b", "env": {"GITFLOW_TARGET_TAG": "v2.0.0"}}]
+    """
+    try:
+        with open(path, "r") as projects_file:
+            raw_projects = json.load(projects_file)
+    except Exception as e:
+        raise errors.CmdException(f"Failed to read projects file '{path}'") from e
+    projects = []
+    for raw_project in raw_projects:
+        if isinstance(raw_project, str):
+            raw_project = {"project": raw_project}
+        envs = {key: str(value) for key, value in raw_project.get("env", {}).items()}
+        envs[config.Config.env_names.gitlab.project] = raw_project["project"]
+        projects += [envs]
+    return projects
+
+
+def _run_project(flow: str, command: str, envs: dict[str, str], resume: bool) -> Result:
+    project = envs[config.Config.env_names.gitlab.project]
+    start = time.monotonic()
+    try:
+        with config.override(envs):
+            _COMMANDS[(flow, command)](Gitflow(), resume)
+    except Exception as e:
+        log.error(f"'{project}' {flow} {command} failed: {e}")
+        return Result(project, time.monotonic() - start, f"{type(e).__name__}: {e}")
+    return Result(project, time.monotonic() - start)
+
+
+def run(
+    flow: str,
+    command: str,
+    projects_path: str,
+    workers: int,
+    resume: bool = False,
+) -> list[Result]:
+    """
+    Runs a gitflow command for many projects on a bounded thread pool.
+    All projects share one Gitlab client, so one HTTP session and one rate
+    limiter, and their artifacts are keyed by project in the shared store.
+    """
+    if (flow, command) not in _COMMANDS:
+        raise errors.CmdException(f"Unknown command: {flow} {command}")
+    projects = load_projects(projects_path)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run,
+                _run_project,
+                flow,
+                command,
+                envs,
+                resume,
+            )
+            for envs in projects
+        ]
+        results = [future.result() for future in futures]
+    report(results)
+    return results
+
+
+def report(results: list[Result]) -> None:
+    width = max([len(result.project) for result in results] + [len("PROJECT")])
+    log.info(f"{'PROJECT':<{width}}  STATUS   TIME")
+    for result in results:
+        status = "failed" if result.error else "ok"
+        line = f"{result.project:<{width}}  {status:<7} {result.seconds:>6.1f}s"
+        if result.error:
+            line += f"  {result.error}"
+        log.info(line)
+    failed = sum(1 for result in results if result.error)
+    log.info(f"{len(results) - failed} succeeded, {failed} failed")
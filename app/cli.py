@@ -1,5 +1,5 @@
 from settings import errors
-from app.gitflow import Gitflow
+from app.helpers import metrics, tracing
 from settings.logger import get_logger
 
 log = get_logger(__name__)
@@ -10,40 +10,85 @@ class Cli:
     Gitflow tool\n
     Possible flows: 'release', 'hotfix', 'support'.
     Possible commands: 'start', 'finish'.
+    Use 'finish --resume' to complete a finish left pending in auto-merge mode.
+    Use 'batch <flow> <command> --projects=<file>' to run a flow for many projects.
+    Use 'gc [--older-than=<days>] [--dry-run]' to remove stale gitflow objects.
     """
 
     @staticmethod
     @errors.error_handler
-    def release(command: str) -> None:
+    @metrics.reported
+    @tracing.exported
+    def release(command: str, resume: bool = False) -> None:
+        from app.gitflow import Gitflow
+
         _gitflow = Gitflow()
         match command:
             case "start":
                 _gitflow.start_release()
             case "finish":
-                _gitflow.finish_release()
+                _gitflow.finish_release(resume=resume)
             case _:
                 raise errors.CmdException(f"Unknown command: {command}")
 
     @staticmethod
     @errors.error_handler
-    def hotfix(command: str):
+    @metrics.reported
+    @tracing.exported
+    def hotfix(command: str, resume: bool = False):
+        from app.gitflow import Gitflow
+
         _gitflow = Gitflow()
         match command:
             case "start":
                 _gitflow.start_hotfix()
             case "finish":
-                _gitflow.finish_hotfix()
+                _gitflow.finish_hotfix(resume=resume)
             case _:
                 raise errors.CmdException(f"Unknown command: {command}")
 
     @staticmethod
     @errors.error_handler
-    def support(command: str):
+    @metrics.reported
+    @tracing.exported
+    def support(command: str, resume: bool = False):
+        from app.gitflow import Gitflow
+
         _gitflow = Gitflow()
         match command:
             case "start":
                 _gitflow.start_support()
             case "finish":
-                _gitflow.finish_support()
+                _gitflow.finish_support(resume=resume)
             case _:
                 raise errors.CmdException(f"Unknown command: {command}")
+
+    @staticmethod
+    @errors.error_handler
+    @metrics.reported
+    @tracing.exported
+    def batch(
+        flow: str,
+        command: str,
+        projects: str,
+        workers: int = 8,
+        resume: bool = False,
+    ):
+        from app import batch
+
+        results = batch.run(flow, command, projects, workers, resume)
+        failed = [result.project for result in results if result.error]
+        if failed:
+            raise errors.GitflowError(f"Failed for projects: {', '.join(failed)}")
+
+    @staticmethod
+    @errors.error_handler
+    @metrics.reported
+    @tracing.exported
+    def gc(older_than: int = 30, dry_run: bool = False):
+        from app import gc
+
+        stale = gc.run(older_than, dry_run)
+        failed = [item.name for item in stale if item.error]
+        if failed:
+            raise errors.GitflowError(f"Failed to remove: {', '.join(failed)}")
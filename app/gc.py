@@ -0,0 +1,195 @@
+from __future__ import annotations
+from settings import config, errors
+from settings.logger import get_logger
+from app.helpers import artifacts, tracing
+from app.gitlab.project import Project
+from app.gitlab import aio
+from datetime import datetime, timedelta, timezone
+import typing
+
+log = get_logger(__name__)
+
+_FLOWS = ("release", "hotfix", "support")
+_PAGE_SIZE = 100
+
+
+class Stale:
+    def __init__(
+        self,
+        kind: str,
+        name: str,
+        reason: str,
+        remove: typing.Callable[[], None],
+    ) -> None:
+        self.kind = kind
+        self.name = name
+        self.reason = reason
+        self.remove = remove
+        self.error: str | None = None
+
+
+def _prefixes() -> tuple[str, ...]:
+    return tuple(getattr(config, flow).prefix for flow in _FLOWS)
+
+
+def _in_flight() -> tuple[set[str], set[int]]:
+    """Branches and milestone ids of flows started but not finished per the artifacts"""
+    branches, milestones = set(), set()
+    for flow in _FLOWS:
+        try:
+            loaded = artifacts.load(flow)
+        except errors.HelpersArtifactsError:
+            continue
+        if "cleanup" in artifacts.journal(loaded):
+            continue
+        branches.add(loaded.branch)
+        if loaded.milestone_id is not None:
+            milestones.add(int(loaded.milestone_id))
+    return branches, milestones
+
+
+def _age_reason(raw_date: str | None, cutoff: datetime) -> str | None:
+    if not raw_date:
+        return None
+    date = datetime.fromisoformat(raw_date)
+    if date < cutoff:
+        return f"untouched since {date.date().isoformat()}"
+    return None
+
+
+def _stale_branches(
+    project: Project,
+    cutoff: datetime,
+    in_flight: set[str],
+) -> typing.Iterator[Stale]:
+    keep = {config.gitlab.master_name, config.gitlab.dev_name} | in_flight
+    for prefix in _prefixes():
+        branches = project.obj.branches.list(
+            search=f"^{prefix}",
+            per_page=_PAGE_SIZE,
+            iterator=True,
+        )
+        for branch in branches:
+            if (
+                branch.name in keep
+                or branch.protected
+                or not branch.name.startswith(prefix)
+            ):
+                continue
+            reason = _age_reason(branch.commit.get("committed_date"), cutoff)
+            if reason and branch.merged:
+                reason = f"merged, {reason}"
+            if reason:
+                yield Stale(
+                    "branch",
+                    branch.name,
+                    reason,
+                    lambda name=branch.name: project.obj.branches.delete(name),
+                )
+
+
+def _stale_milestones(
+    project: Project,
+    cutoff: datetime,
+    in_flight: set[int],
+) -> typing.Iterator[Stale]:
+    prefixes = _prefixes()
+    for milestone in project.obj.milestones.list(per_page=_PAGE_SIZE, iterator=True):
+        if milestone.id in in_flight or not milestone.title.startswith(prefixes):
+            continue
+        reason = "closed"
+        if milestone.state != "closed":
+            reason = _age_reason(milestone.updated_at, cutoff)
+        if reason:
+            yield Stale(
+                "milestone",
+                milestone.title,
+                reason,
+                lambda milestone_id=milestone.id: project.obj.milestones.delete(
+                    milestone_id
+                ),
+            )
+
+
+def _stale_mrs(
+    project: Project,
+    cutoff: datetime,
+    in_flight: set[str],
+) -> typing.Iterator[Stale]:
+    if not config.mr.labels:
+        log.info("GITFLOW_MR_LABELS is empty, skipping merge requests")
+        return
+    prefixes = _prefixes()
+    targets = {config.gitlab.master_name, config.gitlab.dev_name}
+    mrs = project.obj.mergerequests.list(
+        state="opened",
+        labels=",".join(config.mr.labels),
+        per_page=_PAGE_SIZE,
+        iterator=True,
+    )
+    for mr in mrs:
+        if mr.source_branch in in_flight:
+            continue
+        if not mr.source_branch.startswith(prefixes) or mr.target_branch not in targets:
+            continue
+        reason = _age_reason(mr.updated_at, cutoff)
+        if reason:
+
+            def close(mr=mr) -> None:
+                mr.state_event = "close"
+                mr.save()
+
+            yield Stale("mr", f"!{mr.iid} {mr.title}", reason, close)
+
+
+def _remove(item: Stale) -> Stale:
+    try:
+        item.remove()
+    except Exception as e:
+        item.error = f"{type(e).__name__}: {e}"
+    return item
+
+
+def run(older_than: int, dry_run: bool = False) -> list[Stale]:
+    """
+    Finds gitflow branches and labelled open gitflow MRs untouched for
+    older_than days and gitflow milestones that are closed or as old, and
+    removes them: branches and milestones are deleted, MRs are closed. MRs
+    are only considered with GITFLOW_MR_LABELS set, from a flow branch to
+    master or dev.
+
+    Listings are streamed page by page and fully read before anything is
+    removed, so deletions never shift the pages still to come. Removals run
+    concurrently, at most GITFLOW_CONCURRENCY at a time and within
+    GITFLOW_RATE_LIMIT. Flows in progress per the artifacts are left alone.
+    """
+    project = Project()
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than)
+    branches, milestones = _in_flight()
+    with tracing.span("list"):
+        stale = [
+            *_stale_branches(project, cutoff, branches),
+            *_stale_milestones(project, cutoff, milestones),
+            *_stale_mrs(project, cutoff, branches),
+        ]
+    if not dry_run and stale:
+        with tracing.span("remove"):
+            aio.gather(*[lambda item=item: _remove(item) for item in stale])
+    report(stale, dry_run)
+    return stale
+
+
+def report(stale: list[Stale], dry_run: bool) -> None:
+    width = max([len(item.name) for item in stale] + [len("NAME")])
+    log.info(f"{'KIND':<9}  {'NAME':<{width}}  {'STATUS':<8} REASON")
+    for item in stale:
+        status = "stale" if dry_run else ("failed" if item.error else "removed")
+        line = f"{item.kind:<9}  {item.name:<{width}}  {status:<8} {item.reason}"
+        if item.error:
+            line += f"  {item.error}"
+        log.info(line)
+    failed = sum(1 for item in stale if item.error)
+    if dry_run:
+        log.info(f"{len(stale)} stale objects found, dry run removed nothing")
+    else:
+        log.info(f"{len(stale) - failed} removed, {failed} failed")
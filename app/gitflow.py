@@ -2,10 +2,13 @@ from __future__ import annotations
 from app.gitlab.milestone import Milestone
 from settings import config, errors
 from settings.logger import get_logger
-from app.helpers import artifacts
+from app.helpers import artifacts, tracing
+from app.helpers.common import DotDict
 from app.gitlab.project import Project
 from app.gitlab.branch import Branch
+from app.gitlab.mr import Mr
 from app.gitlab.tag import Tag
+from app.gitlab import aio
 import typing
 
 log = get_logger(__name__)
@@ -16,7 +19,7 @@ class Gitflow:
     def __init__(
         self,
     ) -> None:
-        self.project = Project()
+        self.project = Project(project_id=artifacts.project_id())
 
     def __str__(self) -> str:
         return f"Gitlab Project: {self.project}"
@@ -25,28 +28,26 @@ class Gitflow:
         return self.__str__()
 
     def _get_target_tag(self, increment_func: typing.Callable) -> Tag:
-        target_tag = increment_func(self.project.latest_tag)
-        raw_target_tag = config.tag.target
-        if raw_target_tag:
-            target_tag = Tag.parse(raw_target_tag)
-        if self.project.check_tag_exists(target_tag):
-            raise errors.GitflowError(
-                f"Tag '{target_tag}' is already present in the project"
-            )
+        with tracing.span("resolve_tag"):
+            raw_target_tag = config.tag.target
+            if raw_target_tag:
+                target_tag = Tag.parse(raw_target_tag)
+            else:
+                target_tag = increment_func(self.project.latest_tag)
+            if self.project.check_tag_exists(target_tag):
+                raise errors.GitflowError(
+                    f"Tag '{target_tag}' is already present in the project"
+                )
         return target_tag
 
-    def _get_source_tag(self) -> Tag:
+    @staticmethod
+    def _parse_source_tag() -> Tag:
         raw_source_tag = config.tag.source
         if not raw_source_tag:
             raise errors.GitflowError("Source tag is empty. Please provide a valid tag")
-        source_tag = Tag.parse(
+        return Tag.parse(
             raw_tag=raw_source_tag,
         )
-        if not self.project.check_tag_exists(source_tag):
-            raise errors.GitflowError(
-                f"Tag '{source_tag}' is not present in the project"
-            )
-        return source_tag
 
     def start_release(
         self,
@@ -54,21 +55,24 @@ class Gitflow:
         target_tag = self._get_target_tag(Tag.increment_minor)
         name = config.release.prefix + str(target_tag)
         ref = config.release.ref
-        release = self.project.create_branch(name, target_tag, ref)
-        milestone = self.project.create_milestone(release.name)
-        artifacts.dump(
-            {
-                "branch": name,
-                "tag": str(target_tag),
-                "ref": ref,
-                "milestone_id": milestone.id,
-            }
+        self.project.prefetch(branches=(name,), milestone_title=name)
+        release, milestone = aio.gather(
+            tracing.spanned(
+                "create_branch",
+                lambda: self.project.create_branch(name, target_tag, ref),
+            ),
+            tracing.spanned(
+                "create_milestone",
+                lambda: self.project.create_milestone(name),
+            ),
         )
+        self._dump_started("release", release, milestone)
         if config.tag.target:
-            self.project.prune_schedule(
-                name=config.release.schedule,
-                var_name=config.Config.env_names.tag.target,
-            )
+            with tracing.span("prune_schedule"):
+                self.project.prune_schedule(
+                    name=config.release.schedule,
+                    var_name=config.Config.env_names.tag.target,
+                )
         log.info(f"Release '{target_tag}' has been started", url=release.url)
 
     def start_hotfix(
@@ -77,134 +81,307 @@ class Gitflow:
         target_tag = self._get_target_tag(Tag.increment_patch)
         name = config.hotfix.prefix + str(target_tag)
         ref = config.hotfix.ref
-        hotfix = self.project.create_branch(name, target_tag, ref)
-        milestone = self.project.create_milestone(hotfix.name)
-        artifacts.dump(
-            {
-                "branch": name,
-                "tag": str(target_tag),
-                "ref": ref,
-                "milestone_id": milestone.id,
-            }
+        self.project.prefetch(branches=(name,), milestone_title=name)
+        hotfix, milestone = aio.gather(
+            tracing.spanned(
+                "create_branch",
+                lambda: self.project.create_branch(name, target_tag, ref),
+            ),
+            tracing.spanned(
+                "create_milestone",
+                lambda: self.project.create_milestone(name),
+            ),
         )
+        self._dump_started("hotfix", hotfix, milestone)
         if config.tag.target:
-            self.project.prune_schedule(
-                name=config.hotfix.schedule,
-                var_name=config.Config.env_names.tag.target,
-            )
+            with tracing.span("prune_schedule"):
+                self.project.prune_schedule(
+                    name=config.hotfix.schedule,
+                    var_name=config.Config.env_names.tag.target,
+                )
         log.info(f"Hotfix '{target_tag}' has been started", url=hotfix.url)
 
     def start_support(
         self,
     ):
-        source_tag = self._get_source_tag()
+        source_tag = self._parse_source_tag()
         target_tag = Tag.increment_patch(source_tag)
         name = config.support.prefix + str(target_tag)
-        if self.project.check_tag_exists(target_tag):
+        source_exists, target_exists = aio.gather(
+            tracing.spanned(
+                "resolve_tag",
+                lambda: self.project.check_tag_exists(source_tag),
+            ),
+            tracing.spanned(
+                "resolve_tag",
+                lambda: self.project.check_tag_exists(target_tag),
+            ),
+        )
+        if not source_exists:
+            raise errors.GitflowError(
+                f"Tag '{source_tag}' is not present in the project"
+            )
+        if target_exists:
             log.error(f"Failed to start {name}")
             raise errors.GitflowError(
                 f"Tag '{target_tag}' is already present in the project"
             )
-        ref = self.project.obj.tags.get(source_tag).commit["id"]
-        support = self.project.create_branch(name, target_tag, ref)
-        milestone = self.project.create_milestone(support.name)
+        with tracing.span("resolve_tag"):
+            ref = self.project.get_tag(source_tag).commit["id"]
+        self.project.prefetch(branches=(name,), milestone_title=name)
+        support, milestone = aio.gather(
+            tracing.spanned(
+                "create_branch",
+                lambda: self.project.create_branch(name, target_tag, ref),
+            ),
+            tracing.spanned(
+                "create_milestone",
+                lambda: self.project.create_milestone(name),
+            ),
+        )
+        self._dump_started("support", support, milestone)
+        if config.tag.source:
+            with tracing.span("prune_schedule"):
+                self.project.prune_schedule(
+                    name=config.support.schedule,
+                    var_name=config.Config.env_names.tag.source,
+                )
+        log.info(f"Support '{target_tag}' has been started", url=support.url)
+
+    def _dump_started(self, flow: str, branch: Branch, milestone: Milestone) -> None:
         artifacts.dump(
+            flow,
             {
-                "branch": name,
-                "tag": str(target_tag),
-                "ref": ref,
+                "project": self.project.name,
+                "project_id": self.project.id,
+                "branch": branch.name,
+                "branch_url": branch.url,
+                "tag": str(branch.tag),
+                "ref": branch.ref,
                 "milestone_id": milestone.id,
-            }
+                "milestone": {
+                    "id": milestone.id,
+                    "iid": milestone.obj.iid,
+                    "title": milestone.title,
+                    "web_url": milestone.url,
+                },
+            },
         )
-        if config.tag.source:
-            self.project.prune_schedule(
-                name=config.support.schedule,
-                var_name=config.Config.env_names.tag.source,
-            )
-        log.info(f"Support '{target_tag}' has been started", url=support.url)
 
-    def _finish(
-        self,
-        source: Branch,
-        milestone: Milestone,
-    ) -> None:
-        loaded = artifacts.load()
-        to_master = self.project.create_mr(
-            source=source,
-            target=self.project.master,
-            milestone=milestone,
+    def _load_started(self, loaded: DotDict) -> tuple[Branch, Milestone]:
+        """
+        Source branch and milestone of a started flow, rebuilt from the
+        artifacts snapshot without a check if it has one. A source branch
+        deleted meanwhile is reported when its merge request fails.
+        """
+        cached_branch = None
+        if loaded.branch_url:
+            cached_branch = {
+                "name": loaded.branch,
+                "web_url": loaded.branch_url,
+            }
+        master, dev = config.gitlab.master_name, config.gitlab.dev_name
+        done = artifacts.journal(loaded)
+        mrs = []
+        if loaded.milestone:
+            # journaled merge requests are fetched by iid
+            title = loaded.milestone["title"]
+            if "create_mr_to_master" not in done:
+                mrs += [(loaded.branch, master, title)]
+            if "create_mr_to_dev" not in done:
+                mrs += [(master, dev, title)]
+        self.project.prefetch(
+            branches=() if cached_branch else (loaded.branch,),
+            milestone_id=None if loaded.milestone else loaded.milestone_id,
+            mrs=mrs,
         )
-        to_master_mergeable = to_master.is_mergeable()
-        if not to_master_mergeable:
-            raise errors.GitflowError("Failed to finish gitflow")
-        to_master.merge()
         source = self.project.get_branch(
             name=loaded.branch,
             tag=Tag.parse(loaded.tag),
             ref=loaded.ref,
+            cached=cached_branch,
         )
-        mr = self.project.get_mr(
-            source=source,
-            target=self.project.master,
-            milestone=milestone,
+        milestone = self.project.get_milestone(
+            loaded.milestone_id,
+            cached=loaded.milestone,
         )
-        self.project.create_tag(
-            tag=mr.source.tag,
-            ref=mr.obj.merge_commit_sha,
-        )
-        master_to_dev = self.project.create_mr(
-            source=self.project.master,
-            target=self.project.dev,
-            milestone=milestone,
-        )
-        if not master_to_dev.is_mergeable():
-            log.error(
-                "Failed to merge 'master' to 'dev' for tag propagation",
-                url=master_to_dev.url,
+        return source, milestone
+
+    def _finish(
+        self,
+        flow: str,
+        source: Branch,
+        milestone: Milestone,
+        resume: bool = False,
+    ) -> bool:
+        """
+        Runs the finish steps, each completed one is recorded in the artifacts
+        journal, so a rerun after a failure skips straight to the first
+        unfinished step without repeating lookups and waits
+        """
+        done = artifacts.journal(artifacts.load(flow))
+        if resume and "create_mr_to_master" not in done:
+            raise errors.GitflowError(
+                "Nothing to resume. Finish has not been started in auto-merge mode"
             )
-            raise errors.GitflowError()
-        master_to_dev.merge()
-        milestone.delete()
+        if "merge_to_master" not in done:
+            merged = self._merge_to_master(flow, source, milestone, done, resume)
+            if not merged:
+                return False
+            done["merge_to_master"] = merged
+        if "tag" not in done:
+            with tracing.span("tag", tag=str(source.tag)):
+                self.project.create_tag(
+                    tag=source.tag,
+                    ref=done["merge_to_master"].merge_sha,
+                )
+            artifacts.record(flow, "tag", tag=str(source.tag))
+        if "merge_to_dev" not in done:
+            with tracing.span("propagate"):
+                with tracing.span("create_mr"):
+                    master_to_dev = self._journaled_mr(
+                        flow,
+                        "create_mr_to_dev",
+                        done,
+                        source=self.project.master,
+                        target=self.project.dev,
+                        milestone=milestone,
+                    )
+                with tracing.span("wait_mergeable"):
+                    master_to_dev_mergeable = master_to_dev.is_mergeable()
+                if not master_to_dev_mergeable:
+                    log.error(
+                        "Failed to merge 'master' to 'dev' for tag propagation",
+                        url=master_to_dev.url,
+                    )
+                    raise errors.GitflowError()
+                with tracing.span("merge"):
+                    master_to_dev.merge()
+            artifacts.record(flow, "merge_to_dev", mr_iid=master_to_dev.iid)
+        if "cleanup" not in done:
+            with tracing.span("cleanup"):
+                milestone.delete()
+            artifacts.record(flow, "cleanup")
         log.info(
-            f"Tag {mr.source.tag} created and propagated to 'dev' successfully",
-            url=self.project.url + "/-/tags/" + str(mr.source.tag),
+            f"Tag {source.tag} created and propagated to 'dev' successfully",
+            url=self.project.url + "/-/tags/" + str(source.tag),
         )
+        return True
+
+    def _journaled_mr(
+        self,
+        flow: str,
+        step: str,
+        done: dict[str, DotDict],
+        source: Branch,
+        target: Branch,
+        milestone: Milestone,
+    ) -> Mr:
+        if step in done:
+            return self.project.get_mr_by_iid(
+                iid=done[step].mr_iid,
+                source=source,
+                target=target,
+            )
+        try:
+            mr = self.project.create_mr(
+                source=source,
+                target=target,
+                milestone=milestone,
+            )
+        except errors.GitlabMrError:
+            # the source may come from the artifacts, report it if it's gone
+            self.project.get_branch(source.name, source.tag, source.ref)
+            raise
+        done[step] = artifacts.record(flow, step, mr_iid=mr.iid)
+        return mr
+
+    def _merge_to_master(
+        self,
+        flow: str,
+        source: Branch,
+        milestone: Milestone,
+        done: dict[str, DotDict],
+        resume: bool,
+    ) -> DotDict | None:
+        """Returns the journal entry of the merge, None if it is left to auto-merge"""
+        with tracing.span("create_mr"):
+            to_master = self._journaled_mr(
+                flow,
+                "create_mr_to_master",
+                done,
+                source=source,
+                target=self.project.master,
+                milestone=milestone,
+            )
+        if resume:
+            with tracing.span("resume"):
+                self._resume_to_master(to_master)
+        elif config.mr.auto_merge:
+            with tracing.span("merge"):
+                merged = to_master.auto_merge()
+            if not merged:
+                log.info(
+                    f"'{to_master.title}' will be merged when its pipeline succeeds. "
+                    "Run finish with --resume to tag and propagate it to 'dev'",
+                    url=to_master.url,
+                )
+                return None
+        else:
+            with tracing.span("wait_mergeable"):
+                to_master_mergeable = to_master.is_mergeable()
+            if not to_master_mergeable:
+                raise errors.GitflowError("Failed to finish gitflow")
+            with tracing.span("merge"):
+                to_master.merge()
+        to_master.refresh()
+        return artifacts.record(
+            flow,
+            "merge_to_master",
+            mr_iid=to_master.iid,
+            merge_sha=to_master.obj.merge_commit_sha,
+        )
+
+    @staticmethod
+    def _resume_to_master(to_master: Mr) -> None:
+        match to_master.obj.state:
+            case "merged":
+                return
+            case "opened":
+                raise errors.GitflowError(
+                    f"'{to_master.title}' is still waiting for its pipeline to merge"
+                )
+            case _:
+                raise errors.GitflowError(
+                    f"'{to_master.title}' can't be resumed. Mr state: '{to_master.obj.state}'"
+                )
 
     def finish_release(
         self,
+        resume: bool = False,
     ) -> None:
-        loaded = artifacts.load()
-        release = self.project.get_branch(
-            name=loaded.branch,
-            tag=Tag.parse(loaded.tag),
-            ref=loaded.ref,
-        )
-        milestone = self.project.get_milestone(loaded.milestone_id)
-        self._finish(source=release, milestone=milestone)
-        log.info(f"Release '{release.name}' has been finished")
+        loaded = artifacts.load("release")
+        with tracing.span("load"):
+            release, milestone = self._load_started(loaded)
+        if self._finish("release", source=release, milestone=milestone, resume=resume):
+            log.info(f"Release '{release.name}' has been finished")
 
     def finish_hotfix(
         self,
+        resume: bool = False,
     ) -> None:
-        loaded = artifacts.load()
-        hotfix = self.project.get_branch(
-            name=loaded.branch,
-            tag=Tag.parse(loaded.tag),
-            ref=loaded.ref,
-        )
-        milestone = self.project.get_milestone(loaded.milestone_id)
-        self._finish(source=hotfix, milestone=milestone)
-        log.info(f"Hotfix '{hotfix.name}' has been finished")
+        loaded = artifacts.load("hotfix")
+        with tracing.span("load"):
+            hotfix, milestone = self._load_started(loaded)
+        if self._finish("hotfix", source=hotfix, milestone=milestone, resume=resume):
+            log.info(f"Hotfix '{hotfix.name}' has been finished")
 
     def finish_support(
         self,
+        resume: bool = False,
     ) -> None:
-        loaded = artifacts.load()
-        support = self.project.get_branch(
-            name=loaded.branch,
-            tag=Tag.parse(loaded.tag),
-            ref=loaded.ref,
-        )
-        milestone = self.project.get_milestone(loaded.milestone_id)
-        self._finish(source=support, milestone=milestone)
-        log.info(f"Support '{support.name}' has been finished")
+        loaded = artifacts.load("support")
+        with tracing.span("load"):
+            support, milestone = self._load_started(loaded)
+        if self._finish("support", source=support, milestone=milestone, resume=resume):
+            log.info(f"Support '{support.name}' has been finished")
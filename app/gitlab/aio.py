@@ -0,0 +1,28 @@
+from __future__ import annotations
+from settings import config
+import asyncio
+import typing
+
+T = typing.TypeVar("T")
+
+
+async def _run(call: typing.Callable[[], T], semaphore: asyncio.Semaphore) -> T:
+    async with semaphore:
+        return await asyncio.to_thread(call)
+
+
+async def _gather(calls: tuple[typing.Callable[[], typing.Any], ...]) -> list:
+    semaphore = asyncio.Semaphore(config.gitlab.concurrency)
+    return await asyncio.gather(
+        *(_run(call, semaphore) for call in calls),
+        return_exceptions=True,
+    )
+
+
+def gather(*calls: typing.Callable[[], typing.Any]) -> list:
+    """Runs blocking calls in threads, re-raising the first failure once all end"""
+    results = asyncio.run(_gather(calls))
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
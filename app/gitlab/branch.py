@@ -7,7 +7,7 @@ class Branch:
     def __init__(
         self,
         name: str,
-        tag: type.Tag,
+        tag: type.Tag | None,
         ref: str,
         obj: gitlab.v4.objects.ProjectBranch,
         project: type.Project,
@@ -0,0 +1,142 @@
+from __future__ import annotations
+from settings import config, errors
+from settings.logger import get_logger
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import collections
+import threading
+import requests
+import json
+import time
+
+log = get_logger(__name__)
+
+_VERSION = 1
+
+_skipped = threading.local()
+
+
+def _key(request: requests.PreparedRequest) -> tuple[str, str, str]:
+    """Method, path with sorted query and body, host independent"""
+    url = urlsplit(request.url)
+    query = urlencode(sorted(parse_qsl(url.query, keep_blank_values=True)))
+    body = request.body or ""
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", "surrogateescape")
+    return request.method, f"{url.path}?{query}", body
+
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    Sends requests as usual and appends every request and its final response,
+    after retries, to a JSON lines cassette. Request headers, and with them
+    the token, are never written.
+    """
+
+    def __init__(self, path: str, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "w") as cassette_file:
+                cassette_file.write(json.dumps({"version": _VERSION}) + "\n")
+        except OSError as e:
+            raise errors.GitlabCassetteError(
+                f"Failed to create cassette '{path}'"
+            ) from e
+        log.info(f"Recording Gitlab API interactions to '{path}'")
+
+    def send(
+        self, request: requests.PreparedRequest, *args, **kwargs
+    ) -> requests.Response:
+        response = super().send(request, *args, **kwargs)
+        method, url, body = _key(request)
+        interaction = {
+            "method": method,
+            "url": url,
+            "body": body,
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": dict(response.headers),
+            "content": response.content.decode("utf-8", "surrogateescape"),
+        }
+        with self._lock, open(self.path, "a") as cassette_file:
+            cassette_file.write(json.dumps(interaction) + "\n")
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Answers requests from a cassette without any network access.
+
+    Identical requests get their recorded responses in order, the last one is
+    repeated once they run out, so polling ends on the recorded final state.
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        self._interactions: dict[tuple[str, str, str], collections.deque] = {}
+        self._last: dict[tuple[str, str, str], dict] = {}
+        try:
+            with open(self.path, "r") as cassette_file:
+                header = json.loads(cassette_file.readline())
+                if header.get("version") != _VERSION:
+                    raise ValueError(f"unsupported version {header.get('version')}")
+                for line in cassette_file:
+                    interaction = json.loads(line)
+                    key = (
+                        interaction["method"],
+                        interaction["url"],
+                        interaction["body"],
+                    )
+                    self._interactions.setdefault(key, collections.deque()).append(
+                        interaction
+                    )
+        except (OSError, ValueError, KeyError) as e:
+            raise errors.GitlabCassetteError(f"Failed to load cassette '{path}'") from e
+        log.info(f"Replaying Gitlab API interactions from '{path}'")
+
+    def send(
+        self, request: requests.PreparedRequest, *args, **kwargs
+    ) -> requests.Response:
+        key = _key(request)
+        with self._lock:
+            queue = self._interactions.get(key)
+            if queue:
+                self._last[key] = queue.popleft()
+            interaction = self._last.get(key)
+        if interaction is None:
+            raise errors.GitlabCassetteError(
+                f"No recorded response for {request.method} {request.url}"
+            )
+        response = requests.Response()
+        response.status_code = interaction["status"]
+        response.reason = interaction["reason"]
+        response.headers = CaseInsensitiveDict(interaction["headers"])
+        response._content = interaction["content"].encode("utf-8", "surrogateescape")
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+def clock() -> float:
+    """time.monotonic, ahead by the sleeps this thread skipped while replaying"""
+    return time.monotonic() + getattr(_skipped, "seconds", 0.0)
+
+
+def sleep(seconds: float) -> None:
+    """time.sleep, scaled by GITFLOW_CASSETTE_SLEEP_SCALE while replaying"""
+    if config.cassette.mode == "replay":
+        scaled = seconds * config.cassette.sleep_scale
+        _skipped.seconds = getattr(_skipped, "seconds", 0.0) + seconds - scaled
+        seconds = scaled
+    if seconds > 0:
+        time.sleep(seconds)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+from settings import config, errors
+from app.helpers import metrics, tracing
+from app.gitlab import cassette
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import threading
+import requests
+import gitlab
+import time
+
+_RATE_LIMIT_LOW = 0.1
+# 429 is left to python-gitlab, which retries it honouring Retry-After
+_RETRY_STATUSES = (500, 502, 503, 504)
+
+_clients: dict[tuple[str, ...], gitlab.Gitlab] = {}
+_clients_lock = threading.Lock()
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all requests of a client, rate is per second.
+
+    It also spreads the requests left in Gitlab's rate limit window over the
+    time until the window resets, once RateLimit-Remaining drops below
+    _RATE_LIMIT_LOW of RateLimit-Limit, so the client slows down before
+    Gitlab starts throttling it.
+    """
+
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._not_before = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            delay = max(self._not_before - now, 0)
+            if self.rate > 0:
+                elapsed = now - self._updated
+                self._tokens = min(self.rate, self._tokens + elapsed * self.rate)
+                self._updated = now
+                self._tokens -= 1
+                delay = max(delay, -self._tokens / self.rate)
+        if delay > 0:
+            cassette.sleep(delay)
+
+    def update(self, response: requests.Response) -> None:
+        headers = response.headers
+        retry_after = headers.get("Retry-After")
+        if response.status_code == 429 and retry_after and retry_after.isdigit():
+            self._pause(float(retry_after))
+            return
+        remaining = headers.get("RateLimit-Remaining")
+        limit = headers.get("RateLimit-Limit")
+        reset = headers.get("RateLimit-Reset")
+        if not (remaining and limit and reset):
+            return
+        try:
+            remaining, limit, reset = int(remaining), int(limit), float(reset)
+        except ValueError:
+            return
+        if remaining >= limit * _RATE_LIMIT_LOW:
+            return
+        window = max(reset - time.time(), 0)
+        self._pause(window / max(remaining, 1))
+
+    def _pause(self, seconds: float) -> None:
+        with self._lock:
+            self._not_before = max(self._not_before, time.monotonic() + seconds)
+
+
+class Session(requests.Session):
+    """
+    Keep-alive session with a connection pool sized for concurrent flows and
+    retries with backoff for idempotent requests on transient errors. PUT is
+    not retried: merging a merge request is a PUT, and retrying one whose
+    response was lost fails on the already merged merge request.
+    GITFLOW_CASSETTE_MODE records the traffic to a cassette or replays it.
+    """
+
+    def __init__(self, limiter: RateLimiter) -> None:
+        super().__init__()
+        self.limiter = limiter
+        retries = Retry(
+            total=config.gitlab.http_retries,
+            backoff_factor=config.gitlab.http_backoff,
+            status_forcelist=_RETRY_STATUSES,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS - {"PUT"},
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter_args = {
+            "pool_connections": config.gitlab.http_pool_size,
+            "pool_maxsize": config.gitlab.http_pool_size,
+            "max_retries": retries,
+        }
+        match config.cassette.mode:
+            case "":
+                adapter = HTTPAdapter(**adapter_args)
+            case "record":
+                adapter = cassette.RecordingAdapter(
+                    config.cassette.path, **adapter_args
+                )
+            case "replay":
+                adapter = cassette.ReplayAdapter(config.cassette.path)
+            case mode:
+                raise errors.GitlabCassetteError(f"Unknown cassette mode '{mode}'")
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        self.hooks["response"].append(self._on_response)
+
+    def request(self, *args, **kwargs) -> requests.Response:
+        self.limiter.acquire()
+        return super().request(*args, **kwargs)
+
+    def _on_response(self, response: requests.Response, *args, **kwargs) -> None:
+        self.limiter.update(response)
+        metrics.record(response)
+        tracing.record_request(response)
+
+
+def connect() -> gitlab.Gitlab:
+    """
+    Returns the Gitlab client for the configured server and token. Clients
+    are shared between projects, so parallel flows reuse one HTTP session
+    and one rate limiter.
+    """
+    url = config.gitlab.proto + "://" + config.gitlab.host
+    key = (url, config.gitlab.bot_token, config.cassette.mode, config.cassette.path)
+    with _clients_lock:
+        if key not in _clients:
+            session = Session(RateLimiter(config.gitlab.rate_limit))
+            glab = gitlab.Gitlab(
+                url=url,
+                oauth_token=config.gitlab.bot_token,
+                session=session,
+            )
+            if config.logger.level.upper() == "DEBUG":
+                glab.enable_debug(mask_credentials=True)
+            _clients[key] = glab
+    return _clients[key]
@@ -0,0 +1,137 @@
+from __future__ import annotations
+from settings import config, errors
+from settings.logger import get_logger
+from app.gitlab import client
+import typing
+
+log = get_logger(__name__)
+
+_MR_FIELDS = (
+    "iid webUrl state mergeCommitSha conflicts detailedMergeStatus milestone { title }"
+)
+
+
+def query(document: str, variables: dict[str, typing.Any]) -> dict:
+    """Posts a query to the Gitlab GraphQL API through the shared REST session"""
+    glab = client.connect()
+    try:
+        response = glab.session.post(
+            f"{glab.url}/api/graphql",
+            json={"query": document, "variables": variables},
+            headers={"Authorization": f"Bearer {config.gitlab.bot_token}"},
+            timeout=glab.timeout,
+        )
+        response.raise_for_status()
+        result = response.json()
+    except Exception as e:
+        raise errors.GitlabProjectError("GraphQL request failed") from e
+    if result.get("errors"):
+        messages = "; ".join(error.get("message", "") for error in result["errors"])
+        raise errors.GitlabProjectError(f"GraphQL query failed: {messages}")
+    return result["data"]
+
+
+def _id(gid: str) -> int:
+    """gid://gitlab/Milestone/42 -> 42"""
+    return int(gid.rsplit("/", 1)[1])
+
+
+def _mr(node: dict) -> dict:
+    return {
+        "iid": int(node["iid"]),
+        "web_url": node["webUrl"],
+        "state": node["state"],
+        "merge_commit_sha": node["mergeCommitSha"],
+        "has_conflicts": node["conflicts"],
+        "detailed_merge_status": (node["detailedMergeStatus"] or "").lower(),
+        "milestone": node["milestone"],
+    }
+
+
+def bootstrap(
+    project: str,
+    branches: typing.Sequence[str] = (),
+    milestone_id: str | None = None,
+    milestone_title: str | None = None,
+    mrs: typing.Sequence[tuple[str, str, str]] = (),
+) -> dict[tuple, typing.Any]:
+    """
+    Fetches a project with some of its branches, one milestone by id or title
+    and the newest merge request by source, target branch and milestone
+    title in a single query.
+
+    Results are shaped like the REST attributes of the same objects and keyed
+    by ("project",), ("branch", name), ("milestone", id), ("milestone_title",
+    title) and ("mr", source, target). Missing objects map to None, merge
+    requests map to a list.
+    """
+    variables: dict[str, typing.Any] = {"path": project}
+    params = ["$path: ID!"]
+    repository = []
+    for index, name in enumerate(branches):
+        params += [f"$b{index}: String!"]
+        variables[f"b{index}"] = name
+        repository += [
+            f"b{index}: branchNames(searchPattern: $b{index}, offset: 0, limit: 1)",
+            f"c{index}: tree(ref: $b{index}) {{ lastCommit {{ sha }} }}",
+        ]
+    fields = ["id", "webUrl"]
+    if repository:
+        fields += ["repository { " + " ".join(repository) + " }"]
+    milestone_fields = "nodes { id iid title webPath state }"
+    if milestone_id:
+        params += ["$milestone: ID!"]
+        variables["milestone"] = f"gid://gitlab/Milestone/{milestone_id}"
+        fields += [f"milestones(ids: [$milestone]) {{ {milestone_fields} }}"]
+    elif milestone_title:
+        params += ["$milestone: String!"]
+        variables["milestone"] = milestone_title
+        fields += [f"milestones(title: $milestone) {{ {milestone_fields} }}"]
+    for index, (source, target, mr_milestone) in enumerate(mrs):
+        params += [f"$s{index}: String!", f"$t{index}: String!", f"$mt{index}: String!"]
+        variables[f"s{index}"] = source
+        variables[f"t{index}"] = target
+        variables[f"mt{index}"] = mr_milestone
+        fields += [
+            f"m{index}: mergeRequests(sourceBranches: [$s{index}], targetBranches: [$t{index}], "
+            f"milestoneTitle: $mt{index}, first: 1) {{ nodes {{ {_MR_FIELDS} }} }}"
+        ]
+    document = f"query({', '.join(params)}) {{ project(fullPath: $path) {{ {' '.join(fields)} }} }}"
+    data = query(document, variables)["project"]
+
+    result: dict[tuple, typing.Any] = {}
+    if data is None:
+        result[("project",)] = None
+        return result
+    result[("project",)] = {"id": _id(data["id"]), "web_url": data["webUrl"]}
+    for index, name in enumerate(branches):
+        commit = (data["repository"][f"c{index}"] or {}).get("lastCommit")
+        if name not in (data["repository"][f"b{index}"] or []) or commit is None:
+            result[("branch", name)] = None
+            continue
+        result[("branch", name)] = {
+            "name": name,
+            "commit": {"id": commit["sha"]},
+            "web_url": f"{data['webUrl']}/-/tree/{name}",
+        }
+    if milestone_id or milestone_title:
+        nodes = data["milestones"]["nodes"]
+        milestone = None
+        if nodes:
+            milestone = {
+                "id": _id(nodes[0]["id"]),
+                "iid": int(nodes[0]["iid"]),
+                "title": nodes[0]["title"],
+                "state": nodes[0]["state"],
+                "web_url": client.connect().url + nodes[0]["webPath"],
+            }
+        if milestone_id:
+            result[("milestone", str(milestone_id))] = milestone
+        else:
+            result[("milestone_title", milestone_title)] = milestone
+    for index, (source, target, _) in enumerate(mrs):
+        result[("mr", source, target)] = [
+            _mr(node) for node in data[f"m{index}"]["nodes"]
+        ]
+    log.debug("GraphQL bootstrap fetched %d objects of %s", len(result), project)
+    return result
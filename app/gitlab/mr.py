@@ -2,9 +2,8 @@ from __future__ import annotations
 from settings import config, errors
 from settings.logger import get_logger
 from app.helpers import type
-from app.gitlab import pipeline
+from app.gitlab import pipeline, poller, webhook
 import gitlab
-import time
 
 log = get_logger(__name__)
 
@@ -23,11 +22,11 @@ class Mr:
         self.obj = obj
         self.iid = self.obj.iid
         self.url = self.obj.web_url
-        self.title = config.mr.title_template.format(
+        self.title = config.mr.format_title(
             source=f"'{source.name}'",
             target=f"'{target.name}'",
         )
-        self.msg = config.mr.msg_template.format(
+        self.msg = config.mr.format_msg(
             source=f"'{source.name}'",
             target=f"'{target.name}'",
         )
@@ -36,7 +35,7 @@ class Mr:
         try:
             self.obj = self.project.obj.mergerequests.get(id=self.iid)
         except Exception as e:
-            log.debug(f"Failed to refresh {self.title} status: {e}")
+            log.debug("Failed to refresh %s status: %s", self.title, e)
 
     def is_mergeable(self) -> bool:
         self.refresh()
@@ -44,33 +43,14 @@ class Mr:
         if self.obj.has_conflicts:
             log.error(fail + "Mr has conflicts.", url=self.url)
             return False
-        if config.mr.skip_ci == "true":
+        if config.mr.skip_ci:
             pipeline.skip_for_mr(mr=self)
-        timer = 0
-        while timer < config.gitlab.timeout:
-            time.sleep(config.gitlab.timewait)
-            timer += config.gitlab.timewait
-            self.refresh()
-            mr_status = self.obj.detailed_merge_status
-            match mr_status:
-                case "mergeable":
-                    log.debug(f"'{self.title}' is ready to merge.")
-                    return True
-                case "not_open":
-                    log.debug(f"'{self.title}' is already merged.")
-                    return True
-                case "blocked_status" | "conflict" | "not_approved" | "broken_status":
-                    log.error(fail + f"Mr status: '{mr_status}'.", url=self.url)
-                    return False
-                case "checking" | "unchecked" | "preparing":
-                    log.debug("Waiting while merge request is ready...")
-                case "ci_must_pass" | "ci_still_running":
-                    log.debug("Merge request CI still running...")
-                case _:
-                    log.error(
-                        fail + f"Unexpected Mr status: '{mr_status}'.", url=self.url
-                    )
-                    return False
+        mergeable = poller.poll(
+            lambda: self._check_mergeable(fail),
+            sleep=webhook.sleeper(self.project.name, self.iid),
+        )
+        if mergeable is not None:
+            return mergeable
         self.refresh()
         mr_status = self.obj.detailed_merge_status
         log.error(
@@ -79,6 +59,66 @@ class Mr:
         )
         return False
 
+    def _check_mergeable(self, fail: str, ci_ready: bool = False) -> bool | None:
+        self.refresh()
+        mr_status = self.obj.detailed_merge_status
+        match mr_status:
+            case "mergeable":
+                log.debug("'%s' is ready to merge.", self.title)
+                return True
+            case "not_open":
+                log.debug("'%s' is already merged.", self.title)
+                return True
+            case "blocked_status" | "conflict" | "not_approved" | "broken_status":
+                log.error(fail + f"Mr status: '{mr_status}'.", url=self.url)
+                return False
+            case "checking" | "unchecked" | "preparing":
+                log.debug("Waiting while merge request is ready...")
+            case "ci_must_pass" | "ci_still_running":
+                if ci_ready:
+                    return True
+                log.debug("Merge request CI still running...")
+            case _:
+                log.error(fail + f"Unexpected Mr status: '{mr_status}'.", url=self.url)
+                return False
+        return None
+
+    def auto_merge(self) -> bool:
+        """
+        Sets the Mr to merge when its pipeline succeeds.
+        Returns True if it's merged already, so there is nothing to wait for.
+        """
+        self.refresh()
+        if self.obj.state == "merged":
+            return True
+        fail = f"'{self.title}' is NOT ready to merge. Reason: "
+        if self.obj.has_conflicts:
+            log.error(fail + "Mr has conflicts.", url=self.url)
+            raise errors.GitlabMrError("Mr has conflicts.")
+        # a new Mr is still being checked and rejects auto-merge until it's done
+        ready = poller.poll(
+            lambda: self._check_mergeable(fail, ci_ready=True),
+            sleep=webhook.sleeper(self.project.name, self.iid),
+        )
+        mr_status = self.obj.detailed_merge_status
+        if ready is None:
+            log.error(
+                fail + f"Timeout exceeded. Last Mr status: '{mr_status}'.",
+                url=self.url,
+            )
+            raise errors.GitlabMrError("Timeout exceeded.")
+        if not ready:
+            raise errors.GitlabMrError(f"Mr status: '{mr_status}'.")
+        try:
+            self.obj.merge(
+                merge_commit_message=f"{self.msg}",
+                merge_when_pipeline_succeeds=True,
+            )
+        except Exception as e:
+            log.error(f"'{self.title}' failed to set auto-merge.", url=self.url)
+            raise errors.GitlabMrError() from e
+        return self.obj.state == "merged"
+
     def merge(self) -> None:
         fail = f"'{self.title}' failed."
         mr_request = self.project.obj.mergerequests.get(id=self.iid)
@@ -89,17 +129,22 @@ class Mr:
         except Exception as e:
             log.error(fail, url=self.url)
             raise errors.GitlabMrError() from e
-        timer = 0
-        while timer < config.gitlab.timeout:
-            time.sleep(config.gitlab.timewait)
-            timer += config.gitlab.timewait
-            mr_request = self.project.obj.mergerequests.get(id=self.iid)
-            if mr_request.state == "merged":
-                log.info(f"'{self.title}' merged.", url=self.url)
-                return
+        if getattr(self.obj, "state", None) == "merged":
+            log.info(f"'{self.title}' merged.", url=self.url)
+            return
+        wait = webhook.sleeper(self.project.name, self.iid)
+        if poller.poll(self._check_merged, sleep=wait):
+            log.info(f"'{self.title}' merged.", url=self.url)
+            return
         mr_request = self.project.obj.mergerequests.get(id=self.iid)
         log.error(
             f"'{self.title}' failed. Mr state: '{mr_request.state}'. Mr status: '{mr_request.status}'.",
             url=self.url,
         )
         raise errors.GitlabMrError("Timeout exceeded.")
+
+    def _check_merged(self) -> bool | None:
+        mr_request = self.project.obj.mergerequests.get(id=self.iid)
+        if mr_request.state == "merged":
+            return True
+        return None
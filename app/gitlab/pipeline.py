@@ -32,8 +32,10 @@ def skip_for_mr(mr: type.Mr) -> None:
             pipeline.obj.cancel()
         except Exception as e:
             log.debug(
-                f"Failed to cancel Mr '{mr.title}' pipeline. Exception: {e}",
+                "Failed to cancel Mr '%s' pipeline. Exception: %s",
+                mr.title,
+                e,
                 url=pipeline.url,
             )
-        log.debug(f"Mr '{mr.title}' pipeline canceled.", url=pipeline.url)
-    log.debug(f"Failed to get Mr '{mr.title}' pipeline.")
+        log.debug("Mr '%s' pipeline canceled.", mr.title, url=pipeline.url)
+    log.debug("Failed to get Mr '%s' pipeline.", mr.title)
@@ -0,0 +1,38 @@
+from __future__ import annotations
+from settings import config
+from app.gitlab import cassette
+import random
+import typing
+
+T = typing.TypeVar("T")
+
+_BACKOFF = 2
+_JITTER = 0.1
+
+
+def poll(
+    check: typing.Callable[[], T | None],
+    timeout: float | None = None,
+    interval: float | None = None,
+    max_interval: float | None = None,
+    sleep: typing.Callable[[float], typing.Any] = cassette.sleep,
+) -> T | None:
+    """Calls check with a jittered backoff until it returns non-None or times out"""
+    if timeout is None:
+        timeout = config.gitlab.timeout
+    if interval is None:
+        interval = config.gitlab.timewait
+    if max_interval is None:
+        max_interval = config.gitlab.timewait_max
+    started = cassette.clock()
+    while True:
+        result = check()
+        if result is not None:
+            return result
+        remaining = timeout - (cassette.clock() - started)
+        if remaining <= 0:
+            return None
+        delay = min(interval, max_interval) * random.uniform(1 - _JITTER, 1 + _JITTER)
+        delay = min(delay, remaining)
+        sleep(delay)
+        interval *= _BACKOFF
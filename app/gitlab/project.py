@@ -4,37 +4,62 @@ from settings.logger import get_logger
 from app.gitlab.pipeline import Pipeline
 from app.gitlab.branch import Branch
 from app.gitlab.mr import Mr
-from app.gitlab.tag import Tag
+from app.gitlab.tag import Tag, TagIndex
 from app.gitlab.milestone import Milestone
-import time
+from app.gitlab import client, graphql, poller
+from app.helpers.cache import TagCache
+from gitlab.v4.objects import ProjectBranch, ProjectMergeRequest, ProjectMilestone
+import functools
+import itertools
+import typing
 import gitlab
 
-
 log = get_logger(__name__)
 
+_TAG_PAGE_SIZE = 100
+_UNKNOWN = object()
+
 
 class Project:
     def __init__(
         self,
+        project_id: int | None = None,
     ) -> None:
+        """A known project_id addresses the project without fetching it"""
         self.name = config.gitlab.project
+        self.id = project_id
         self.bot_id = config.gitlab.bot_id
         self.bot_token = config.gitlab.bot_token
-        gitlab_url = config.gitlab.proto + "://" + config.gitlab.host
-        glab = gitlab.Gitlab(url=gitlab_url, oauth_token=self.bot_token)
-        if config.logger.level.upper() == "DEBUG":
-            glab.enable_debug(mask_credentials=True)
-        self.url = gitlab_url + "/" + self.name
-        self.obj = glab.projects.get(self.name)
-        self.latest_tag = self.get_latest_tag()
-        self.master = self.get_branch(
+        glab = client.connect()
+        self.url = glab.url + "/" + self.name
+        self._tag_index: TagIndex | None = None
+        self._repo_tags: dict[str, gitlab.v4.objects.ProjectTag] = {}
+        self._prefetched: dict[tuple, typing.Any] = {}
+        if self.prefetch(branches=(config.gitlab.master_name, config.gitlab.dev_name)):
+            self.obj = glab.projects.get(self.id, lazy=True)
+        elif self.id is not None:
+            self.obj = glab.projects.get(self.id, lazy=True)
+        else:
+            self.obj = glab.projects.get(self.name)
+            self.id = self.obj.id
+
+    @functools.cached_property
+    def latest_tag(self) -> Tag:
+        return self.get_latest_tag()
+
+    @functools.cached_property
+    def master(self) -> Branch:
+        return self.get_branch(
             name=config.gitlab.master_name,
-            tag=self.latest_tag,
+            tag=None,
             ref=config.gitlab.master_name,
         )
-        self.dev = self.get_branch(
+
+    @functools.cached_property
+    def dev(self) -> Branch:
+        return self.get_branch(
             name=config.gitlab.dev_name,
-            tag=self.latest_tag,
+            tag=None,
             ref=config.gitlab.dev_name,
         )
 
@@ -44,6 +69,33 @@ class Project:
     def __repr__(self) -> str:
         return self.__str__()
 
+    def prefetch(
+        self,
+        branches: typing.Sequence[str] = (),
+        milestone_id: str | None = None,
+        milestone_title: str | None = None,
+        mrs: typing.Sequence[tuple[str, str, str]] = (),
+    ) -> bool:
+        """Serves the next lookup of each given object from one GraphQL query"""
+        if not config.gitlab.graphql:
+            return False
+        try:
+            result = graphql.bootstrap(
+                self.name,
+                branches=branches,
+                milestone_id=milestone_id,
+                milestone_title=milestone_title,
+                mrs=mrs,
+            )
+        except errors.GitlabProjectError as e:
+            log.warning(f"GraphQL bootstrap failed, falling back to REST: {e}")
+            return False
+        if result[("project",)] is None:
+            raise errors.GitlabProjectError(f"Project '{self.name}' not found")
+        self.id = result[("project",)]["id"]
+        self._prefetched.update(result)
+        return True
+
     def create_tag(
         self,
         tag: Tag,
@@ -52,7 +104,7 @@ class Project:
         if self.check_tag_exists(tag):
             return
         try:
-            self.obj.tags.create(
+            obj = self.obj.tags.create(
                 {
                     "tag_name": str(tag),
                     "ref": ref,
@@ -61,39 +113,153 @@ class Project:
             )
         except Exception as e:
             raise errors.GitlabTagError(f"Failed to create {tag} tag") from e
+        self._repo_tags[str(tag)] = obj
+        if self._tag_index is not None:
+            self._tag_index.add(tag)
 
-    def get_latest_tag(self) -> Tag:
+    @property
+    def tags(self) -> TagIndex:
+        if self._tag_index is None:
+            self._tag_index = self._fetch_tags()
+        return self._tag_index
+
+    def _fetch_tags(self) -> TagIndex:
+        cache = TagCache.load(self.name)
+        if cache is None:
+            return self._build_tag_index(self._iter_tags())
+        warm = not cache.expired and bool(cache.tags)
+        if warm:
+            new_tags = self._list_new_tags(cache.names)
+            if new_tags is None:
+                log.debug("Tag count differs from the cache, rescanning tags")
+                warm = False
+            else:
+                cache.merge(new_tags)
+        if not warm:
+            cache.replace(list(self._iter_tags()))
+        index = self._build_tag_index(cache.tags)
+        if warm:
+            for deleted in self._drop_deleted_latest(index):
+                cache.discard(str(deleted))
+            if index.latest is None and cache.tags:
+                log.debug("Cached tags were deleted, rescanning tags")
+                cache.replace(list(self._iter_tags()))
+                index = self._build_tag_index(cache.tags)
+        try:
+            cache.save()
+        except errors.HelpersCacheError as e:
+            log.warning(str(e))
+        return index
+
+    def _drop_deleted_latest(self, index: TagIndex) -> list[Tag]:
+        """Falls back to the next candidate while the latest tag is deleted"""
+        deleted = []
+        while index.latest and not self.check_tag_exists(index.latest):
+            log.debug("Tag '%s' was deleted", index.latest)
+            deleted += [index.latest]
+            index.discard(index.latest)
+        return deleted
+
+    def _iter_tags(self) -> typing.Iterator[tuple[str, str]]:
+        """Streams tags page by page instead of loading the whole list"""
+        pagination = {}
+        if config.gitlab.get_all_tags:
+            pagination = {"per_page": _TAG_PAGE_SIZE, "iterator": True}
         try:
             repo_tags = self.obj.tags.list(
                 order_by="updated",
                 sort="desc",
-                get_all=config.gitlab.get_all_tags,
+                **pagination,
             )
+            for repo_tag in repo_tags:
+                yield repo_tag.name, repo_tag.commit["created_at"]
         except Exception as e:
             raise errors.GitlabTagError("Failed to retrieve tags list") from e
-        tag_list = []
-        for repo_tag in repo_tags:
-            tag = Tag.parse(repo_tag.name)
-            tag.update_timestamp(repo_tag.commit["created_at"])
-            tag_list += [tag]
-        tag_list = sorted(tag_list)
-        return tag_list[-1]
 
-    def check_tag_exists(self, check_tag: Tag) -> bool:
+    def _list_new_tags(self, known: set[str]) -> list[tuple[str, str]] | None:
+        """None asks for a rescan when the tag count shows unseen older tags"""
+        new_tags = []
+        known_in_row = 0
         try:
             repo_tags = self.obj.tags.list(
-                get_all=config.gitlab.get_all_tags,
+                order_by="updated",
+                sort="desc",
+                per_page=_TAG_PAGE_SIZE,
+                iterator=True,
             )
+            for repo_tag in repo_tags:
+                if repo_tag.name in known:
+                    known_in_row += 1
+                    if known_in_row >= _TAG_PAGE_SIZE:
+                        break
+                    continue
+                known_in_row = 0
+                new_tags += [(repo_tag.name, repo_tag.commit["created_at"])]
+            else:
+                return new_tags
         except Exception as e:
             raise errors.GitlabTagError("Failed to retrieve tags list") from e
-        tag_list = []
-        for repo_tag in repo_tags:
-            tag = Tag.parse(repo_tag.name)
-            tag.update_timestamp(repo_tag.commit["created_at"])
-            tag_list += [tag]
-        if check_tag not in tag_list:
-            return False
-        return True
+        total = repo_tags.total
+        if total is not None and total != len(known) + len(new_tags):
+            return None
+        return new_tags
+
+    @staticmethod
+    def _build_tag_index(repo_tags: typing.Iterable[tuple[str, str]]) -> TagIndex:
+        index = TagIndex()
+        skipped = 0
+        for page in itertools.batched(repo_tags, _TAG_PAGE_SIZE):
+            tags, invalid = Tag.parse_many(page)
+            skipped += invalid
+            for tag in tags:
+                index.add(tag)
+        if skipped:
+            log.debug("Skipped %d tags not matching the tag regexp", skipped)
+        return index
+
+    def get_latest_tag(self) -> Tag:
+        latest_tag = self.tags.latest
+        if latest_tag is None:
+            raise errors.GitlabTagError("No tags found in the project")
+        return latest_tag
+
+    def check_tag_exists(self, check_tag: Tag) -> bool:
+        return self.get_tag(check_tag) is not None
+
+    def get_tag(self, tag: Tag) -> gitlab.v4.objects.ProjectTag | None:
+        name = str(tag)
+        if name in self._repo_tags:
+            return self._repo_tags[name]
+        try:
+            obj = self.obj.tags.get(name)
+        except gitlab.exceptions.GitlabGetError as e:
+            if e.response_code != 404:
+                raise errors.GitlabTagError(f"Failed to get {name} tag") from e
+            obj = None
+        except Exception as e:
+            raise errors.GitlabTagError(f"Failed to get {name} tag") from e
+        if obj is None and not config.tag.exact_lookup:
+            obj = self._search_tag(tag)
+        if obj is not None:
+            self._repo_tags[name] = obj
+        return obj
+
+    def _search_tag(self, tag: Tag) -> gitlab.v4.objects.ProjectTag | None:
+        """Finds a tag named unlike the normalized one, e.g. zero-padded"""
+        try:
+            repo_tags = self.obj.tags.list(
+                search=f"{tag.patch}{tag.postfix}$",
+                iterator=True,
+            )
+            for repo_tag in repo_tags:
+                try:
+                    if Tag.parse(repo_tag.name) == tag:
+                        return repo_tag
+                except errors.GitlabTagError:
+                    continue
+        except Exception as e:
+            raise errors.GitlabTagError(f"Failed to search {tag} tag") from e
+        return None
 
     def create_branch(
         self,
@@ -116,9 +282,16 @@ class Project:
     def get_branch(
         self,
         name: str,
-        tag: Tag,
+        tag: Tag | None,
         ref: str,
+        cached: dict | None = None,
     ) -> Branch:
+        """Cached attributes, e.g. from the artifacts, skip the request"""
+        attrs = cached or self._prefetched.pop(("branch", name), _UNKNOWN)
+        if attrs is None:
+            raise errors.GitlabBranchError(f"Failed to get {name} branch")
+        if attrs is not _UNKNOWN:
+            return Branch(name, tag, ref, ProjectBranch(self.obj.branches, attrs), self)
         try:
             obj = self.obj.branches.get(name)
         except Exception as e:
@@ -142,7 +315,21 @@ class Project:
         log.info(f"Milestone for {title} created", url=milestone.web_url)
         return Milestone(milestone)
 
-    def get_milestone(self, milestone_id: str) -> Milestone:
+    def get_milestone(
+        self,
+        milestone_id: str,
+        cached: dict | None = None,
+    ) -> Milestone:
+        """Cached attributes, e.g. from the artifacts, skip the request"""
+        attrs = cached or self._prefetched.pop(
+            ("milestone", str(milestone_id)), _UNKNOWN
+        )
+        if attrs is None:
+            raise errors.GitlabMilestoneError(
+                f"Failed to get milestone with milestone_id={milestone_id}"
+            )
+        if attrs is not _UNKNOWN:
+            return Milestone(ProjectMilestone(self.obj.milestones, attrs))
         try:
             milestone = self.obj.milestones.get(id=milestone_id)
         except Exception as e:
@@ -152,6 +339,11 @@ class Project:
         return Milestone(milestone)
 
     def get_milestone_by_title(self, milestone_title: str) -> Milestone | None:
+        attrs = self._prefetched.pop(("milestone_title", milestone_title), _UNKNOWN)
+        if attrs is None:
+            return None
+        if attrs is not _UNKNOWN:
+            return Milestone(ProjectMilestone(self.obj.milestones, attrs))
         try:
             milestone = self.obj.milestones.list(title=milestone_title)
         except Exception as e:
@@ -168,7 +360,7 @@ class Project:
         target: Branch,
         milestone: Milestone,
     ) -> Mr:
-        title = config.mr.title_template.format(source=source.name, target=target.name)
+        title = config.mr.format_title(source=source.name, target=target.name)
         assignee = config.mr.assignee
         if not assignee:
             assignee = config.gitlab.bot_id
@@ -186,10 +378,10 @@ class Project:
                     "source_branch": source.name,
                     "target_branch": target.name,
                     "assignee_id": assignee,
-                    "reviewer_ids": config.mr.reviewers,
+                    "reviewer_ids": list(config.mr.reviewers),
                     "remove_source_branch": config.mr.rm_source,
                     "squash": config.mr.squash,
-                    "labels": config.mr.labels,
+                    "labels": list(config.mr.labels),
                     "milestone_id": milestone.id,
                 }
             )
@@ -205,6 +397,13 @@ class Project:
         target: Branch,
         milestone: Milestone,
     ) -> Mr | None:
+        prefetched = self._prefetched.pop(("mr", source.name, target.name), _UNKNOWN)
+        if prefetched is not _UNKNOWN:
+            for attrs in prefetched:
+                if (attrs["milestone"] or {}).get("title") == milestone.title:
+                    obj = ProjectMergeRequest(self.obj.mergerequests, attrs)
+                    return Mr(source, target, obj, self)
+            return None
         try:
             obj = self.obj.mergerequests.list(
                 milestone=milestone.title,
@@ -213,22 +412,33 @@ class Project:
             )
         except Exception as e:
             raise errors.GitlabMrError(
-                f"Failed to get from {source.name} to {target.name} merge request with {milestone.title} milestone"
+                f"Failed to get from {source.name} to {target.name} merge request"
+                f" with {milestone.title} milestone"
             ) from e
         if obj:
             return Mr(source, target, obj[0], self)
         return None
 
+    def get_mr_by_iid(
+        self,
+        iid: int,
+        source: Branch,
+        target: Branch,
+    ) -> Mr:
+        try:
+            obj = self.obj.mergerequests.get(id=iid)
+        except Exception as e:
+            raise errors.GitlabMrError(f"Failed to get !{iid} merge request") from e
+        return Mr(source, target, obj, self)
+
     def get_latest_pipeline(self, ref: str) -> Pipeline | None:
-        timer = 0
-        while timer < config.gitlab.timeout:
-            time.sleep(config.gitlab.timewait)
-            timer += config.gitlab.timewait
+        def check() -> Pipeline | None:
             pipelines = self.obj.pipelines.list(ref=ref)
             if pipelines:
-                pipeline = pipelines[0]
-                return Pipeline(pipeline, self)
-        return None
+                return Pipeline(pipelines[0], self)
+            return None
+
+        return poller.poll(check)
 
     def prune_schedule(
         self,
@@ -238,10 +448,11 @@ class Project:
         name = name.upper()
         schedule_id = None
         try:
-            schedules = self.obj.pipelineschedules.list()
+            schedules = self.obj.pipelineschedules.list(iterator=True)
             for schedule in schedules:
                 if schedule.description == name:
                     schedule_id = str(schedule.id)
+                    break
         except Exception as e:
             log.warning(f"Failed to get schedule list: {e}")
         if not schedule_id:
@@ -256,6 +467,8 @@ class Project:
                 url=url,
             )
         log.debug(
-            f"'{var_name}' variable successfully deleted at '{name}' pipeline schedule",
+            "'%s' variable successfully deleted at '%s' pipeline schedule",
+            var_name,
+            name,
             url=url,
         )
@@ -1,11 +1,63 @@
 from __future__ import annotations
 from settings import config, errors
 from datetime import datetime, timezone
-import semver
+import functools
+import typing
+import math
 import re
 
 
+@functools.cache
+def _compile_fused(
+    tag_pattern: re.Pattern, semver_pattern: re.Pattern
+) -> re.Pattern | None:
+    """
+    Fuses the tag and semver regexps into one pattern, which matches the
+    semver regexp at the start of the version group through a lookahead.
+    Returns None when the regexps can't be fused.
+    """
+    regexp, semver_regexp = tag_pattern.pattern, semver_pattern.pattern
+    group_start = regexp.find("(?P<version>")
+    if group_start == -1:
+        return None
+    body_start = group_start + len("(?P<version>")
+    try:
+        fused_pattern = re.compile(
+            regexp[:body_start] + f"(?=(?:{semver_regexp}))" + regexp[body_start:]
+        )
+    except re.error:
+        return None
+    if not {"major", "minor", "patch"} <= fused_pattern.groupindex.keys():
+        return None
+    return fused_pattern
+
+
+def _semver_end(match: re.Match) -> int:
+    return max(match.end("major"), match.end("minor"), match.end("patch"))
+
+
 class Tag:
+    """
+    Immutable tag ordered by (major, minor, patch, created_at).
+
+    Tags are equal and hash equal when their (prefix, version, postfix)
+    match. The created_at timestamp only breaks ties between tags with the
+    same version and different prefix or postfix, tags without it are
+    considered the newest ones.
+    """
+
+    __slots__ = (
+        "major",
+        "minor",
+        "patch",
+        "prefix",
+        "postfix",
+        "version",
+        "sort_key",
+        "_key",
+        "_raw_timestamp",
+        "_timestamp",
+    )
 
     def __init__(
         self,
@@ -16,20 +68,26 @@ class Tag:
         postfix: str,
         timestamp: str = None,
     ) -> None:
-        self.major = major
-        self.minor = minor
-        self.patch = patch
-        self.version = f"{major}.{minor}.{patch}"
-        self.prefix = prefix
-        self.postfix = postfix
-        self.message = config.tag.message_template.format(tag=str(self))
-        if not timestamp:
-            timestamp = (
-                datetime.now(timezone.utc)
-                .astimezone()
-                .isoformat(sep="T", timespec="milliseconds")
-            )
-        self.timestamp = datetime.fromisoformat(timestamp)
+        init = object.__setattr__
+        init(self, "major", major)
+        init(self, "minor", minor)
+        init(self, "patch", patch)
+        init(self, "prefix", prefix)
+        init(self, "postfix", postfix)
+        init(self, "version", f"{major}.{minor}.{patch}")
+        init(self, "_key", (prefix, major, minor, patch, postfix))
+        init(self, "_raw_timestamp", timestamp)
+        init(self, "_timestamp", None)
+        created_at = math.inf
+        if timestamp:
+            created_at = datetime.fromisoformat(timestamp).timestamp()
+        init(self, "sort_key", (major, minor, patch, created_at))
+
+    def __setattr__(self, name, value) -> None:
+        raise AttributeError(f"Tag is immutable, can't set '{name}'")
+
+    def __delattr__(self, name) -> None:
+        raise AttributeError(f"Tag is immutable, can't delete '{name}'")
 
     def __str__(self) -> str:
         return f"{self.prefix}{self.version}{self.postfix}"
@@ -37,58 +95,89 @@ class Tag:
     def __repr__(self):
         return self.__str__()
 
+    def __hash__(self) -> int:
+        return hash(self._key)
+
     def __eq__(self, other) -> bool:
-        comp = semver.compare(self.version, other.version)
-        if comp == 0 and self.prefix == other.prefix and self.postfix == other.postfix:
-            return True
-        return False
+        if not isinstance(other, Tag):
+            return NotImplemented
+        return self._key == other._key
 
     def __ne__(self, other) -> bool:
-        return not self.__eq__(other)
+        if not isinstance(other, Tag):
+            return NotImplemented
+        return self._key != other._key
 
     def __lt__(self, other) -> bool:
-        comp = semver.compare(self.version, other.version)
-        if comp == -1:
-            return True
-        if comp == 0 and (self.prefix != other.prefix or self.postfix != other.postfix):
-            return self.timestamp < other.timestamp
-        return False
+        return self.sort_key < other.sort_key and self._key != other._key
 
     def __le__(self, other) -> bool:
-        if self == other:
-            return True
-        return self < other
+        return self._key == other._key or self.sort_key < other.sort_key
 
     def __gt__(self, other) -> bool:
-        comp = semver.compare(self.version, other.version)
-        if comp == 1:
-            return True
-        if comp == 0 and (self.prefix != other.prefix or self.postfix != other.postfix):
-            return self.timestamp > other.timestamp
-        return False
+        return self.sort_key > other.sort_key and self._key != other._key
 
     def __ge__(self, other) -> bool:
-        if self == other:
-            return True
-        return self > other
+        return self._key == other._key or self.sort_key > other.sort_key
+
+    @property
+    def message(self) -> str:
+        return config.tag.format_message(tag=str(self))
+
+    @property
+    def timestamp(self) -> datetime:
+        if self._timestamp is None:
+            if self._raw_timestamp:
+                timestamp = datetime.fromisoformat(self._raw_timestamp)
+            else:
+                timestamp = datetime.now(timezone.utc).astimezone()
+            object.__setattr__(self, "_timestamp", timestamp)
+        return self._timestamp
 
     @staticmethod
-    def parse(raw_tag: str) -> Tag:
-        match = re.match(config.tag.regexp, raw_tag)
+    def parse(raw_tag: str, timestamp: str = None) -> Tag:
+        match = config.tag.regexp.match(raw_tag)
         if not match:
             raise errors.GitlabTagError(f"Invalid tag: {raw_tag}")
         prefix = match.group("prefix")
         postfix = match.group("postfix")
         raw_version = match.group("version")
         major, minor, patch = Tag._parse_semver(raw_version)
-        return Tag(major, minor, patch, prefix, postfix)
+        return Tag(major, minor, patch, prefix, postfix, timestamp)
 
-    def update_timestamp(self, timestamp: str) -> None:
-        self.timestamp = timestamp
+    @staticmethod
+    def parse_many(
+        raw_tags: typing.Iterable[str | tuple[str, str]],
+    ) -> tuple[list[Tag], int]:
+        """
+        Parses tag names or (name, timestamp) pairs in a single regexp pass
+        per tag. Invalid tags are skipped and counted instead of raising.
+        """
+        fused_pattern = _compile_fused(config.tag.regexp, config.tag.semver_regexp)
+        tags = []
+        skipped = 0
+        for raw_tag in raw_tags:
+            timestamp = None
+            if not isinstance(raw_tag, str):
+                raw_tag, timestamp = raw_tag
+            match = fused_pattern.match(raw_tag) if fused_pattern else None
+            if match and match.end("version") >= _semver_end(match):
+                major, minor, patch, prefix, postfix = match.group(
+                    "major", "minor", "patch", "prefix", "postfix"
+                )
+                tags.append(
+                    Tag(int(major), int(minor), int(patch), prefix, postfix, timestamp)
+                )
+                continue
+            try:
+                tags.append(Tag.parse(raw_tag, timestamp))
+            except errors.GitlabTagError:
+                skipped += 1
+        return tags, skipped
 
     @staticmethod
     def _parse_semver(raw_version: str) -> tuple[int, int, int]:
-        match = re.match(config.tag.semver_regexp, raw_version)
+        match = config.tag.semver_regexp.match(raw_version)
         if not match:
             raise errors.GitlabTagError(f"Invalid version: {raw_version}")
         major = int(match.group("major"))
@@ -131,3 +220,44 @@ class Tag:
             source.prefix,
             source.postfix,
         )
+
+
+class TagIndex:
+    """
+    Bounded index of the newest project tags.
+
+    Only the top_k greatest tags of every (major, minor) version line are
+    kept, so memory does not grow with the number of tags in the project,
+    while the next candidate is at hand if the latest tag turns out deleted.
+    """
+
+    def __init__(self, top_k: int = 3) -> None:
+        self.top_k = top_k
+        self._lines: dict[tuple[int, int], list[Tag]] = {}
+        self._latest: Tag | None = None
+
+    @property
+    def latest(self) -> Tag | None:
+        return self._latest
+
+    def add(self, tag: Tag) -> None:
+        line = self._lines.setdefault((tag.major, tag.minor), [])
+        if tag in line:
+            return
+        if len(line) >= self.top_k and not line[-1] < tag:
+            return
+        line.append(tag)
+        line.sort(key=lambda line_tag: line_tag.sort_key, reverse=True)
+        del line[self.top_k :]
+        if self._latest is None or not tag < self._latest:
+            self._latest = tag
+
+    def discard(self, tag: Tag) -> None:
+        line = self._lines.get((tag.major, tag.minor), [])
+        if tag in line:
+            line.remove(tag)
+        if not line:
+            self._lines.pop((tag.major, tag.minor), None)
+        if tag == self._latest:
+            heads = [line[0] for line in self._lines.values()]
+            self._latest = max(heads, key=lambda head: head.sort_key, default=None)
@@ -0,0 +1,140 @@
+from __future__ import annotations
+from settings import config
+from settings.logger import get_logger
+from app.gitlab import cassette
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import hmac
+import json
+import typing
+
+log = get_logger(__name__)
+
+_listener: WebhookListener | None = None
+_listener_lock = threading.Lock()
+_failed = False
+
+
+class WebhookListener:
+    """
+    Local HTTP listener for Gitlab merge request and pipeline webhook events.
+
+    Events are counted per (project path, merge request iid), so a waiting
+    step can wake up as soon as anything happens to its merge request.
+    """
+
+    def __init__(self, port: int, token: str | None) -> None:
+        self.token = token
+        self._counts: dict[tuple[str, int], int] = {}
+        self._changed = threading.Condition()
+        self._server = ThreadingHTTPServer(("", port), _handler(self))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name="gitflow-webhook",
+            daemon=True,
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+        log.debug("Listening for webhook events on port %s", self.port)
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def notify(self, event: dict) -> None:
+        key = _event_key(event)
+        if key is None:
+            return
+        with self._changed:
+            self._counts[key] = self._counts.get(key, 0) + 1
+            self._changed.notify_all()
+        log.debug("Webhook event '%s' for Mr !%s", event.get("object_kind"), key[1])
+
+    def sleeper(self, key: tuple[str, int]) -> typing.Callable[[float], None]:
+        """Sleeps up to the given delay, waking up on a new event for key"""
+        with self._changed:
+            seen = self._counts.get(key, 0)
+
+        def sleep(delay: float) -> None:
+            nonlocal seen
+            with self._changed:
+                self._changed.wait_for(
+                    lambda: self._counts.get(key, 0) > seen,
+                    timeout=delay,
+                )
+                seen = self._counts.get(key, 0)
+
+        return sleep
+
+
+def _event_key(event: dict) -> tuple[str, int] | None:
+    project = (event.get("project") or {}).get("path_with_namespace")
+    match event.get("object_kind"):
+        case "merge_request":
+            mr = event.get("object_attributes") or {}
+        case "pipeline":
+            mr = event.get("merge_request") or {}
+        case _:
+            return None
+    if not project or mr.get("iid") is None:
+        return None
+    return project, int(mr["iid"])
+
+
+def _handler(listener: WebhookListener) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:
+            token = self.headers.get("X-Gitlab-Token", "")
+            if listener.token and not hmac.compare_digest(token, listener.token):
+                self.send_response(401)
+                self.end_headers()
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                event = json.loads(self.rfile.read(length))
+            except ValueError:
+                self.send_response(400)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.end_headers()
+            if isinstance(event, dict):
+                listener.notify(event)
+
+        def log_message(self, format: str, *args) -> None:
+            log.debug("Webhook request: " + format, *args)
+
+    return Handler
+
+
+def get_listener() -> WebhookListener | None:
+    """Starts the listener on first use if GITFLOW_WEBHOOK_PORT is set"""
+    global _listener, _failed
+    if config.webhook.port is None or _failed:
+        return None
+    with _listener_lock:
+        if _listener is None:
+            try:
+                _listener = WebhookListener(
+                    port=config.webhook.port,
+                    token=config.webhook.token,
+                )
+            except OSError as e:
+                log.warning(f"Failed to start webhook listener, polling only: {e}")
+                _failed = True
+                return None
+            _listener.start()
+    return _listener
+
+
+def sleeper(project: str, mr_iid: int) -> typing.Callable[[float], typing.Any]:
+    listener = get_listener()
+    if listener is None:
+        return cassette.sleep
+    return listener.sleeper((project, mr_iid))
@@ -1,31 +1,146 @@
+import contextlib
+import fcntl
 import json
+import os
+import typing
 from settings import config, errors
+from settings.logger import get_logger
 from app.helpers.common import DotDict
 from datetime import datetime, timezone
+from urllib.parse import quote
 
+# 1: branch, tag, ref, milestone_id
+# 2: adds project, project_id, branch_url, milestone snapshot and journal
+_VERSION = 2
 
-def dump(artifacts: dict) -> None:
-    iso_timestamp = (
+log = get_logger(__name__)
+
+
+def _timestamp() -> str:
+    return (
         datetime.now(timezone.utc)
         .astimezone()
         .isoformat(sep="T", timespec="milliseconds")
     )
-    artifacts.update(
-        {
-            "timestamp": iso_timestamp,
-        }
-    )
+
+
+def _project_dir() -> str:
+    return os.path.join(config.artifacts.dir, quote(config.gitlab.project, safe=""))
+
+
+def _path(flow: str) -> str:
+    """One record per project and flow, so concurrent flows never collide"""
+    return os.path.join(_project_dir(), f"{flow}.json")
+
+
+@contextlib.contextmanager
+def _locked(flow: str, exclusive: bool) -> typing.Iterator[None]:
+    """flock on a sidecar file, shared for readers and exclusive for writers"""
+    path = _path(flow)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        lock_file = open(f"{path}.lock", "a")
+    except OSError as e:
+        raise errors.HelpersArtifactsError(f"Failed to lock '{path}'") from e
+    with lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _write(flow: str, artifacts: dict) -> None:
+    """Writes through a temporary file, so a crash never leaves it half written"""
+    artifacts.setdefault("version", _VERSION)
+    artifacts["timestamp"] = _timestamp()
+    path = _path(flow)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
     try:
-        with open(config.artifacts.path, "w") as artifacts_file:
+        with open(tmp_path, "w") as artifacts_file:
             json.dump(artifacts, artifacts_file)
+            artifacts_file.flush()
+            os.fsync(artifacts_file.fileno())
+        os.replace(tmp_path, path)
     except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         raise errors.HelpersArtifactsError() from e
 
 
-def load() -> DotDict:
+def _read(path: str) -> DotDict:
+    """Older versions load as is, the fields they lack are simply not cached"""
     try:
-        with open(config.artifacts.path, "r") as artifacts_file:
-            artifacts = json.load(artifacts_file)
-            return DotDict(artifacts)
+        with open(path, "r") as artifacts_file:
+            artifacts = DotDict(json.load(artifacts_file))
     except Exception as e:
         raise errors.HelpersArtifactsError() from e
+    version = artifacts.version or 1
+    if version > _VERSION:
+        raise errors.HelpersArtifactsError(
+            f"Artifacts version {version} is newer than the supported {_VERSION}"
+        )
+    return artifacts
+
+
+def dump(flow: str, artifacts: dict) -> None:
+    with _locked(flow, exclusive=True):
+        _write(flow, artifacts)
+
+
+def _migrate_legacy(flow: str) -> None:
+    """Moves the flow's record out of the single GITFLOW_ARTIFACTS_PATH file"""
+    legacy_path = config.artifacts.legacy_path
+    if not legacy_path or not os.path.isfile(legacy_path):
+        return
+    with _locked(flow, exclusive=True):
+        if os.path.exists(_path(flow)):
+            return
+        legacy = _read(legacy_path)
+        if not (legacy.branch or "").startswith(getattr(config, flow).prefix):
+            return
+        legacy.setdefault("version", 1)
+        _write(flow, legacy)
+    log.info(
+        f"Artifacts of '{legacy.branch}' migrated from '{legacy_path}' to '{_path(flow)}'"
+    )
+
+
+def load(flow: str) -> DotDict:
+    if not os.path.exists(_path(flow)):
+        _migrate_legacy(flow)
+    with _locked(flow, exclusive=False):
+        return _read(_path(flow))
+
+
+def record(flow: str, step: str, **data) -> DotDict:
+    """Appends a completed step to the flow's journal and returns the entry"""
+    entry = DotDict({"step": step, **data, "timestamp": _timestamp()})
+    with _locked(flow, exclusive=True):
+        artifacts = _read(_path(flow))
+        artifacts["journal"] = (artifacts.journal or []) + [entry]
+        _write(flow, artifacts)
+    return entry
+
+
+def journal(artifacts: DotDict) -> dict[str, DotDict]:
+    """Completed steps of the flow by name, the latest entry wins"""
+    return {entry["step"]: DotDict(entry) for entry in artifacts.journal or []}
+
+
+def project_id() -> int | None:
+    """Project id cached by any flow of the configured project, if any"""
+    try:
+        names = os.listdir(_project_dir())
+    except OSError:
+        return None
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        try:
+            artifacts = _read(os.path.join(_project_dir(), name))
+        except errors.HelpersArtifactsError:
+            continue
+        if artifacts.project == config.gitlab.project and artifacts.project_id:
+            return artifacts.project_id
+    return None
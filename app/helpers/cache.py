@@ -0,0 +1,89 @@
+from __future__ import annotations
+from settings import config, errors
+from urllib.parse import quote
+import json
+import os
+import time
+
+_VERSION = 1
+
+
+class TagCache:
+    """
+    On-disk tag list of a project, newest updated first.
+
+    Entries are (name, commit created_at) pairs, so the tag index can be
+    rebuilt without touching the API. The whole cache expires after
+    GITFLOW_TAG_CACHE_MAX_AGE seconds and is then rebuilt from a full scan,
+    which also evicts tags deleted in the meantime.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        project: str,
+        tags: list[tuple[str, str]] | None = None,
+        synced_at: float = 0,
+    ) -> None:
+        self.path = path
+        self.project = project
+        self.tags = tags or []
+        self.synced_at = synced_at
+
+    @property
+    def expired(self) -> bool:
+        return time.time() - self.synced_at > config.tag_cache.max_age
+
+    @property
+    def names(self) -> set[str]:
+        return {name for name, _ in self.tags}
+
+    def merge(self, new_tags: list[tuple[str, str]]) -> None:
+        new_names = {name for name, _ in new_tags}
+        self.tags = new_tags + [tag for tag in self.tags if tag[0] not in new_names]
+
+    def replace(self, tags: list[tuple[str, str]]) -> None:
+        self.tags = tags
+        self.synced_at = time.time()
+
+    def discard(self, name: str) -> None:
+        self.tags = [tag for tag in self.tags if tag[0] != name]
+
+    def save(self) -> None:
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w") as cache_file:
+                json.dump(
+                    {
+                        "version": _VERSION,
+                        "project": self.project,
+                        "synced_at": self.synced_at,
+                        "tags": self.tags,
+                    },
+                    cache_file,
+                )
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            raise errors.HelpersCacheError(
+                f"Failed to save tag cache '{self.path}'"
+            ) from e
+
+    @staticmethod
+    def load(project: str) -> TagCache | None:
+        if not config.tag_cache.dir:
+            return None
+        path = os.path.join(config.tag_cache.dir, quote(project, safe="") + ".json")
+        cache = TagCache(path, project)
+        if not os.path.exists(path):
+            return cache
+        try:
+            with open(path, "r") as cache_file:
+                raw = json.load(cache_file)
+            if raw["version"] != _VERSION or raw["project"] != project:
+                return cache
+            cache.tags = [(name, created_at) for name, created_at in raw["tags"]]
+            cache.synced_at = raw["synced_at"]
+        except Exception:
+            return TagCache(path, project)
+        return cache
@@ -0,0 +1,132 @@
+from __future__ import annotations
+from settings import config
+from settings.logger import get_logger
+from urllib.parse import urlsplit
+import contextlib
+import contextvars
+import functools
+import threading
+import json
+import os
+import typing
+
+log = get_logger(__name__)
+
+_COLLECTIONS = {
+    "projects",
+    "tags",
+    "branches",
+    "milestones",
+    "merge_requests",
+    "pipelines",
+    "pipeline_schedules",
+    "variables",
+}
+
+_step: contextvars.ContextVar[str] = contextvars.ContextVar("step", default="")
+_calls: list[dict] = []
+_calls_lock = threading.Lock()
+
+
+def current_step() -> str:
+    return _step.get()
+
+
+@contextlib.contextmanager
+def step(name: str) -> typing.Iterator[None]:
+    """Attributes Gitlab API calls made inside the block to the gitflow step"""
+    token = _step.set(name)
+    try:
+        yield
+    finally:
+        _step.reset(token)
+
+
+def endpoint(url: str) -> str:
+    """Turns /api/v4/projects/group%2Fname/merge_requests/12 into .../:id/..."""
+    segments = urlsplit(url).path.split("/")
+    for index in range(1, len(segments)):
+        if segments[index - 1] in _COLLECTIONS and segments[index] not in _COLLECTIONS:
+            segments[index] = ":id"
+    return "/".join(segments)
+
+
+def record(response) -> None:
+    if not config.metrics.enabled:
+        return
+    request = response.request
+    call = {
+        "project": config.gitlab.project,
+        "step": _step.get() or "init",
+        "method": request.method,
+        "endpoint": endpoint(request.url),
+        "status": response.status_code,
+        "seconds": response.elapsed.total_seconds(),
+        "bytes": len(response.content or b""),
+    }
+    with _calls_lock:
+        _calls.append(call)
+
+
+def summary() -> list[dict]:
+    grouped: dict[tuple[str, str, str], dict] = {}
+    with _calls_lock:
+        calls = list(_calls)
+    for call in calls:
+        key = (call["step"], call["method"], call["endpoint"])
+        group = grouped.setdefault(
+            key,
+            {
+                "step": call["step"],
+                "method": call["method"],
+                "endpoint": call["endpoint"],
+                "calls": 0,
+                "errors": 0,
+                "seconds": 0.0,
+                "bytes": 0,
+            },
+        )
+        group["calls"] += 1
+        group["errors"] += call["status"] >= 400
+        group["seconds"] += call["seconds"]
+        group["bytes"] += call["bytes"]
+    return list(grouped.values())
+
+
+def report() -> None:
+    """Logs the API call summary and writes it as JSON to the artifacts directory"""
+    if not config.metrics.enabled:
+        return
+    groups = summary()
+    log.info(
+        f"{'STEP':<36} {'METHOD':<6} {'ENDPOINT':<60} CALLS ERR   TIME[s]    BYTES"
+    )
+    for group in groups:
+        log.info(
+            f"{group['step']:<36} {group['method']:<6} {group['endpoint']:<60} "
+            f"{group['calls']:>5} {group['errors']:>3} {group['seconds']:>9.3f} {group['bytes']:>8}"
+        )
+    total_calls = sum(group["calls"] for group in groups)
+    total_seconds = sum(group["seconds"] for group in groups)
+    log.info(f"Total: {total_calls} Gitlab API calls, {total_seconds:.3f}s")
+    path = os.path.join(config.artifacts.dir, "metrics.json")
+    try:
+        os.makedirs(config.artifacts.dir, exist_ok=True)
+        with open(path, "w") as metrics_file:
+            with _calls_lock:
+                json.dump({"summary": groups, "calls": _calls}, metrics_file)
+    except Exception as e:
+        log.warning(f"Failed to write metrics to '{path}': {e}")
+
+
+def reported(func: typing.Callable) -> typing.Callable:
+    """Reports metrics once the wrapped command is done, even if it failed"""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            report()
+
+    return wrapper
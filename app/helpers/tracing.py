@@ -0,0 +1,137 @@
+from __future__ import annotations
+from settings import config
+from settings.logger import get_logger
+from app.helpers import metrics
+import contextlib
+import functools
+import threading
+import json
+import os
+import time
+import typing
+
+log = get_logger(__name__)
+
+_origin = time.perf_counter_ns()
+_events: list[dict] = []
+_events_lock = threading.Lock()
+
+
+class Span:
+    def __init__(self, name: str, attributes: dict) -> None:
+        self.name = name
+        self.attributes = attributes
+        self.start = time.perf_counter_ns()
+
+
+def _enabled() -> bool:
+    return bool(config.tracing.path)
+
+
+def _add_event(
+    name: str, category: str, start_ns: int, end_ns: int, args: dict
+) -> None:
+    event = {
+        "name": name,
+        "cat": category,
+        "ph": "X",
+        "ts": (start_ns - _origin) / 1000,
+        "dur": (end_ns - start_ns) / 1000,
+        "pid": os.getpid(),
+        "tid": threading.get_ident(),
+        "args": args,
+    }
+    with _events_lock:
+        _events.append(event)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes) -> typing.Iterator[Span]:
+    """
+    Traces the block as a span, nested into the enclosing one by time.
+    Gitlab API calls made inside it are accounted to the metrics step named
+    after the path of nested spans, e.g. 'release/propagate/merge'.
+    """
+    current = Span(name, attributes)
+    parent = metrics.current_step()
+    with metrics.step(f"{parent}/{name}" if parent else name):
+        try:
+            yield current
+        except Exception as e:
+            current.attributes["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            end = time.perf_counter_ns()
+            seconds = (end - current.start) / 1e9
+            log.debug(
+                "Step '%s' took %.3fs",
+                name,
+                seconds,
+                extra={"duration": round(seconds, 6)},
+            )
+            if _enabled():
+                _add_event(
+                    name,
+                    "gitflow",
+                    current.start,
+                    end,
+                    {**current.attributes, "project": config.gitlab.project},
+                )
+
+
+def spanned(
+    name: str, call: typing.Callable[[], typing.Any], **attributes
+) -> typing.Callable:
+    """Wraps a call to run in its own span, e.g. for concurrent calls"""
+
+    def run():
+        with span(name, **attributes):
+            return call()
+
+    return run
+
+
+def record_request(response) -> None:
+    """Adds a finished Gitlab API call as a span ending now"""
+    if not _enabled():
+        return
+    end = time.perf_counter_ns()
+    start = end - int(response.elapsed.total_seconds() * 1e9)
+    _add_event(
+        f"{response.request.method} {metrics.endpoint(response.request.url)}",
+        "http",
+        start,
+        end,
+        {"status": response.status_code, "url": response.request.url},
+    )
+
+
+def export() -> None:
+    """Writes spans as Chrome trace JSON, which Perfetto can open as well"""
+    if not _enabled():
+        return
+    path = config.tracing.path
+    try:
+        with _events_lock:
+            trace = {"traceEvents": list(_events), "displayTimeUnit": "ms"}
+        with open(path, "w") as trace_file:
+            json.dump(trace, trace_file)
+    except Exception as e:
+        log.warning(f"Failed to write trace to '{path}': {e}")
+        return
+    log.info(f"Trace written to '{path}'")
+
+
+def exported(func: typing.Callable) -> typing.Callable:
+    """Traces the wrapped command as the root span and exports the trace"""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            attributes = {key: str(value) for key, value in kwargs.items()}
+            with span(func.__name__, args=[str(arg) for arg in args], **attributes):
+                return func(*args, **kwargs)
+        finally:
+            export()
+
+    return wrapper
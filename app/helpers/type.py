@@ -1,13 +1,13 @@
-from app.gitlab import branch, mr, pipeline, project, tag, milestone
-from app.helpers import artifacts, common
-from app import cli, gitflow
+from __future__ import annotations
+import typing
 
-type Branch = type(branch.Branch)
-type Mr = type(mr.Mr)
-type Pipeline = type(pipeline.Pipeline)
-type Project = type(project.Project)
-type Tag = type(tag.Tag)
-type DotDict = type(common.DotDict)
-type Cli = type(cli.Cli)
-type Gitflow = type(gitflow.Gitflow)
-type Milestone = type(milestone.Milestone)
+if typing.TYPE_CHECKING:
+    from app.gitlab.branch import Branch
+    from app.gitlab.mr import Mr
+    from app.gitlab.pipeline import Pipeline
+    from app.gitlab.project import Project
+    from app.gitlab.tag import Tag
+    from app.gitlab.milestone import Milestone
+    from app.helpers.common import DotDict
+    from app.cli import Cli
+    from app.gitflow import Gitflow
@@ -0,0 +1,410 @@
+"""
+In-process fake of the Gitlab REST API endpoints used by gitflow.
+
+It keeps one project in memory with synthetic tags, pipeline schedules and
+merge requests, answers with a configurable latency and counts requests
+per (method, endpoint). The RELEASE, HOTFIX and SUPPORT schedules pruned by
+start exist next to the synthetic ones, and unknown or non-numeric ids are
+answered with 404 like Gitlab does. With hold_merges, merge requests stay
+open after a merge request until complete_merge is called, like a merge
+Gitlab runs in the background.
+"""
+
+from __future__ import annotations
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from datetime import datetime, timedelta, timezone
+import collections
+import itertools
+import threading
+import json
+import re
+import time
+
+API = "/api/v4"
+FLOW_SCHEDULES = ("RELEASE", "HOTFIX", "SUPPORT")
+# Gitlab leaves out X-Total and X-Total-Pages past this many records
+_MAX_COUNTED = 10_000
+
+
+class FakeGitlab:
+    def __init__(
+        self,
+        project: str = "group/project",
+        tags: int = 1000,
+        schedules: int = 100,
+        mrs: int = 100,
+        latency: float = 0.0,
+        hold_merges: bool = False,
+    ) -> None:
+        self.project = project
+        self.latency = latency
+        self.hold_merges = hold_merges
+        self.calls: collections.Counter[tuple[str, str]] = collections.Counter()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1000)
+        self.created_at = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+        self.branches = {"master": "0" * 40, "dev": "1" * 40}
+        self.tags = self._generate_tags(tags)
+        self.tag_names = {tag["name"]: tag for tag in self.tags}
+        self.milestones: dict[int, dict] = {}
+        self.mrs: dict[int, dict] = {}
+        self.pipelines: dict[int, dict] = {}
+        self.schedules = [
+            {"id": index, "description": f"SCHEDULE-{index}", "variables": []}
+            for index in range(schedules)
+        ]
+        self.schedules += [
+            {
+                "id": schedules + index,
+                "description": name,
+                "variables": [
+                    {"key": "GITFLOW_TARGET_TAG"},
+                    {"key": "GITFLOW_SOURCE_TAG"},
+                ],
+            }
+            for index, name in enumerate(FLOW_SCHEDULES)
+        ]
+        for index in range(mrs):
+            self._new_mr(f"feature/{index}", "dev", None, state="merged")
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def host(self) -> str:
+        return f"127.0.0.1:{self._server.server_address[1]}"
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}"
+
+    def __enter__(self) -> FakeGitlab:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    @staticmethod
+    def _generate_tags(count: int) -> list[dict]:
+        """v1.0.0 and up, newest first as Gitlab lists them by update time"""
+        start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        tags = []
+        for index in range(count):
+            major, rest = divmod(index, 10_000)
+            minor, patch = divmod(rest, 100)
+            created_at = start + timedelta(minutes=index)
+            tags += [
+                {
+                    "name": f"v{major + 1}.{minor}.{patch}",
+                    "message": "",
+                    "commit": {
+                        "id": f"{index:040x}",
+                        "created_at": created_at.isoformat(timespec="milliseconds"),
+                    },
+                }
+            ]
+        tags.reverse()
+        return tags
+
+    def _new_mr(
+        self, source: str, target: str, milestone: dict | None, **attrs
+    ) -> dict:
+        iid = next(self._ids)
+        mr = {
+            "id": iid,
+            "iid": iid,
+            "title": f"Merge {source} to {target}",
+            "source_branch": source,
+            "target_branch": target,
+            "milestone": milestone,
+            "state": "opened",
+            "detailed_merge_status": "mergeable",
+            "merge_status": "can_be_merged",
+            "has_conflicts": False,
+            "merge_commit_sha": None,
+            "web_url": f"{self.project}/-/merge_requests/{iid}",
+        }
+        mr.update(attrs)
+        self.mrs[iid] = mr
+        return mr
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are separate writes, Nagle would delay the body
+            disable_nagle_algorithm = True
+
+            def do_GET(self) -> None:
+                self._dispatch("GET")
+
+            def do_POST(self) -> None:
+                self._dispatch("POST")
+
+            def do_PUT(self) -> None:
+                self._dispatch("PUT")
+
+            def do_DELETE(self) -> None:
+                self._dispatch("DELETE")
+
+            def _dispatch(self, method: str) -> None:
+                if fake.latency:
+                    time.sleep(fake.latency)
+                url = urlsplit(self.path)
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                segments = [unquote(segment) for segment in url.path.split("/")]
+                endpoint = re.sub(r"/\d+", "/:id", url.path.split("?")[0])
+                with fake._lock:
+                    fake.calls[(method, endpoint)] += 1
+                    status, payload, headers = fake.route(
+                        method, segments[3:], query, body
+                    )
+                data = b"" if status == 204 else json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        return Handler
+
+    def _page(self, items: list, query: dict, path: str) -> tuple[int, list, dict]:
+        page = int(query.get("page", 1))
+        per_page = int(query.get("per_page", 20))
+        start = (page - 1) * per_page
+        headers = {
+            "X-Page": str(page),
+            "X-Per-Page": str(per_page),
+        }
+        if len(items) <= _MAX_COUNTED:
+            headers["X-Total"] = str(len(items))
+            headers["X-Total-Pages"] = str(
+                max((len(items) + per_page - 1) // per_page, 1)
+            )
+        if start + per_page < len(items):
+            next_query = dict(query, page=str(page + 1), per_page=str(per_page))
+            params = "&".join(f"{key}={value}" for key, value in next_query.items())
+            headers["X-Next-Page"] = str(page + 1)
+            headers["Link"] = f'<{self.url}{API}/{path}?{params}>; rel="next"'
+        return 200, items[start : start + per_page], headers
+
+    def route(
+        self, method: str, parts: list[str], query: dict, body: dict
+    ) -> tuple[int, object, dict]:
+        not_found = (404, {"message": "404 Not Found"}, {})
+        if (
+            len(parts) < 2
+            or parts[0] != "projects"
+            or parts[1] not in (self.project, "1")
+        ):
+            return not_found
+        base = f"projects/{parts[1].replace('/', '%2F')}"
+        rest = parts[2:]
+        match method, rest:
+            case "GET", []:
+                return (
+                    200,
+                    {
+                        "id": 1,
+                        "path_with_namespace": self.project,
+                        "web_url": self.project,
+                    },
+                    {},
+                )
+            case "GET", ["repository", "tags"]:
+                tags = self.tags
+                search = query.get("search")
+                if search:
+                    tags = [tag for tag in tags if _search(tag["name"], search)]
+                return self._page(tags, query, f"{base}/repository/tags")
+            case "GET", ["repository", "tags", name]:
+                tag = self.tag_names.get(name)
+                return (200, tag, {}) if tag else not_found
+            case "POST", ["repository", "tags"]:
+                tag = {
+                    "name": body["tag_name"],
+                    "message": body.get("message", ""),
+                    "commit": {
+                        "id": self.branches.get(body["ref"], body["ref"]),
+                        "created_at": datetime.now(timezone.utc).isoformat(
+                            timespec="milliseconds"
+                        ),
+                    },
+                }
+                self.tags.insert(0, tag)
+                self.tag_names[tag["name"]] = tag
+                return 201, tag, {}
+            case "GET", ["repository", "branches"]:
+                branches = [
+                    self._branch(name)
+                    for name in self.branches
+                    if _search(name, query.get("search", ""))
+                ]
+                return self._page(branches, query, f"{base}/repository/branches")
+            case "GET", ["repository", "branches", name]:
+                if name not in self.branches:
+                    return not_found
+                return 200, self._branch(name), {}
+            case "POST", ["repository", "branches"]:
+                ref = body.get("ref") or query.get("ref")
+                name = body.get("branch") or query.get("branch")
+                sha = (
+                    self.branches.get(ref)
+                    or (self.tag_names.get(ref) or {}).get("commit", {}).get("id")
+                    or ref
+                )
+                self.branches[name] = sha
+                return 201, self._branch(name), {}
+            case "GET", ["milestones"]:
+                milestones = [
+                    milestone
+                    for milestone in self.milestones.values()
+                    if "title" not in query or milestone["title"] == query["title"]
+                ]
+                return self._page(milestones, query, f"{base}/milestones")
+            case "POST", ["milestones"]:
+                milestone_id = next(self._ids)
+                milestone = {
+                    "id": milestone_id,
+                    "iid": milestone_id,
+                    "title": body["title"],
+                    "state": "active",
+                    "web_url": f"{self.project}/-/milestones/{milestone_id}",
+                }
+                self.milestones[milestone_id] = milestone
+                return 201, milestone, {}
+            case "GET", ["milestones", milestone_id]:
+                milestone = self.milestones.get(_id(milestone_id))
+                return (200, milestone, {}) if milestone else not_found
+            case "PUT", ["milestones", milestone_id]:
+                milestone = self.milestones.get(_id(milestone_id))
+                if not milestone:
+                    return not_found
+                milestone.update(body)
+                return 200, milestone, {}
+            case "DELETE", ["milestones", milestone_id]:
+                self.milestones.pop(_id(milestone_id), None)
+                return 204, None, {}
+            case "GET", ["merge_requests"]:
+                mrs = [
+                    mr
+                    for mr in self.mrs.values()
+                    if (
+                        query.get("source_branch") in (None, mr["source_branch"])
+                        and query.get("target_branch") in (None, mr["target_branch"])
+                        and query.get("milestone")
+                        in (None, (mr["milestone"] or {}).get("title"))
+                    )
+                ]
+                return self._page(mrs, query, f"{base}/merge_requests")
+            case "POST", ["merge_requests"]:
+                milestone = self.milestones.get(body.get("milestone_id"))
+                mr = self._new_mr(
+                    body["source_branch"], body["target_branch"], milestone
+                )
+                return 201, mr, {}
+            case "GET", ["merge_requests", iid]:
+                mr = self.mrs.get(_id(iid))
+                return (200, mr, {}) if mr else not_found
+            case "PUT", ["merge_requests", iid, "merge"]:
+                mr = self.mrs.get(_id(iid))
+                if not mr:
+                    return not_found
+                if body.get("merge_when_pipeline_succeeds") or self.hold_merges:
+                    mr["merge_when_pipeline_succeeds"] = True
+                    return 200, mr, {}
+                self._merge(mr)
+                return 200, mr, {}
+            case "GET", ["pipelines"]:
+                ref = query.get("ref", "")
+                match_ref = re.fullmatch(r"refs/merge-requests/(\d+)/head", ref)
+                if match_ref and int(match_ref.group(1)) not in self.pipelines:
+                    pipeline_id = int(match_ref.group(1))
+                    self.pipelines[pipeline_id] = {
+                        "id": pipeline_id,
+                        "ref": ref,
+                        "status": "running",
+                        "web_url": f"{self.project}/-/pipelines/{pipeline_id}",
+                    }
+                pipelines = [
+                    pipeline
+                    for pipeline in self.pipelines.values()
+                    if pipeline["ref"] == ref
+                ]
+                return self._page(pipelines, query, f"{base}/pipelines")
+            case "POST", ["pipelines", pipeline_id, "cancel"]:
+                pipeline = self.pipelines.get(_id(pipeline_id))
+                if not pipeline:
+                    return not_found
+                pipeline["status"] = "canceled"
+                return 200, pipeline, {}
+            case "GET", ["pipeline_schedules"]:
+                return self._page(self.schedules, query, f"{base}/pipeline_schedules")
+            case "GET", ["pipeline_schedules", schedule_id]:
+                schedule = self._schedule(schedule_id)
+                return (200, schedule, {}) if schedule else not_found
+            case "DELETE", ["pipeline_schedules", schedule_id, "variables", key]:
+                schedule = self._schedule(schedule_id)
+                keys = [
+                    variable["key"]
+                    for variable in (schedule or {}).get("variables", [])
+                ]
+                if key not in keys:
+                    return not_found
+                schedule["variables"].pop(keys.index(key))
+                return 204, None, {}
+        return not_found
+
+    def complete_merge(self, iid: int) -> None:
+        with self._lock:
+            self._merge(self.mrs[iid])
+
+    def _merge(self, mr: dict) -> None:
+        sha = f"{next(self._ids):040x}"
+        self.branches[mr["target_branch"]] = sha
+        mr.update(
+            state="merged", detailed_merge_status="not_open", merge_commit_sha=sha
+        )
+
+    def _schedule(self, schedule_id: str) -> dict | None:
+        for schedule in self.schedules:
+            if schedule["id"] == _id(schedule_id):
+                return schedule
+        return None
+
+    def _branch(self, name: str) -> dict:
+        return {
+            "name": name,
+            "commit": {"id": self.branches[name], "committed_date": self.created_at},
+            "merged": False,
+            "protected": name in ("master", "dev"),
+            "web_url": f"{self.project}/-/tree/{name}",
+        }
+
+
+def _id(value: str) -> int | None:
+    """Numeric path ids, anything else matches nothing and ends up a 404"""
+    return int(value) if value.isdigit() else None
+
+
+def _search(name: str, search: str) -> bool:
+    if search.startswith("^"):
+        return name.startswith(search[1:])
+    if search.endswith("$"):
+        return name.endswith(search[:-1])
+    return search in name
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Fake Gitlab webhook sender and a merge wait demo against the fake Gitlab.
+
+FakeWebhook posts merge request and pipeline events the way Gitlab does.
+The demo merges a merge request the fake Gitlab completes in the background
+after --merge-after seconds, once polling only and once with the webhook
+listener woken by a merge request event, and reports both wait times.
+
+Usage: python benchmarks/fake_webhook.py [--merge-after SECS] [--timewait SECS]
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path[:0] = [ROOT, os.path.dirname(__file__)]
+
+from fake_gitlab import FakeGitlab  # noqa: E402
+from flows import flow_envs  # noqa: E402
+
+TOKEN = "benchmark"
+
+
+class FakeWebhook:
+    def __init__(self, url: str, token: str = TOKEN) -> None:
+        self.url = url
+        self.token = token
+
+    def merge_request(self, project: str, iid: int, action: str = "update") -> int:
+        return self._post(
+            {
+                "object_kind": "merge_request",
+                "project": {"path_with_namespace": project},
+                "object_attributes": {"iid": iid, "action": action},
+            }
+        )
+
+    def pipeline(self, project: str, iid: int, status: str = "success") -> int:
+        return self._post(
+            {
+                "object_kind": "pipeline",
+                "project": {"path_with_namespace": project},
+                "object_attributes": {"status": status},
+                "merge_request": {"iid": iid},
+            }
+        )
+
+    def _post(self, event: dict) -> int:
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(event).encode(),
+            headers={"Content-Type": "application/json", "X-Gitlab-Token": self.token},
+            method="POST",
+        )
+        with urllib.request.urlopen(request) as response:
+            return response.status
+
+
+def wait_merge(fake: FakeGitlab, envs: dict[str, str], merge_after: float) -> float:
+    """Seconds Mr.merge waits for a merge completed after merge_after seconds"""
+    from settings import config
+    from app.gitlab import webhook
+    from app.gitlab.project import Project
+
+    with config.override(envs):
+        project = Project()
+        dev = project.get_branch(config.gitlab.dev_name, None, config.gitlab.dev_name)
+        master = project.get_branch(
+            config.gitlab.master_name, None, config.gitlab.master_name
+        )
+        milestone = project.create_milestone(f"webhook-{time.monotonic_ns()}")
+        mr = project.create_mr(dev, master, milestone)
+        listener = webhook.get_listener()
+
+        def complete() -> None:
+            fake.complete_merge(mr.iid)
+            if listener is not None:
+                sender = FakeWebhook(f"http://127.0.0.1:{listener.port}/")
+                sender.pipeline(project.name, mr.iid)
+                sender.merge_request(project.name, mr.iid, action="merge")
+
+        timer = threading.Timer(merge_after, complete)
+        started = time.perf_counter()
+        timer.start()
+        mr.merge()
+        timer.join()
+        return time.perf_counter() - started
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--merge-after", type=float, default=0.5)
+    parser.add_argument("--timewait", type=int, default=5)
+    args = parser.parse_args()
+
+    fake = FakeGitlab(tags=10, hold_merges=True)
+    with fake, tempfile.TemporaryDirectory() as tmp:
+        envs = flow_envs(fake, "release", os.path.join(tmp, "artifacts"))
+        envs.update(
+            {
+                "GITFLOW_TIMEWAIT": str(args.timewait),
+                "GITFLOW_TIMEWAIT_MAX": str(args.timewait),
+                "GITFLOW_WEBHOOK_TOKEN": TOKEN,
+            }
+        )
+        polling = wait_merge(fake, envs, args.merge_after)
+        webhook = wait_merge(
+            fake, dict(envs, GITFLOW_WEBHOOK_PORT="0"), args.merge_after
+        )
+    print(f"{'polling only':<14} {polling:>7.3f} s")
+    print(f"{'webhook':<14} {webhook:>7.3f} s")
+    if webhook >= args.timewait:
+        print("Webhook event did not wake the merge wait")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
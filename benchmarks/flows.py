@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+End-to-end flow benchmarks against an in-process fake Gitlab server.
+
+Every flow (start and finish of release, hotfix and support) runs against
+a fresh fake project of the given size and answering with the given latency.
+Each case reports wall time, the number of API calls and the peak Python
+memory, and is compared with the stored baseline: more API calls than the
+baseline always fail, time and memory fail past the tolerance.
+
+Usage: python benchmarks/flows.py [--tags N,...] [--latency MS]
+       [--tolerance PCT] [--update-baseline]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path[:0] = [ROOT, os.path.dirname(__file__)]
+
+from fake_gitlab import FakeGitlab  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(__file__), "flows.baseline.json")
+FLOWS = ("release", "hotfix", "support")
+
+
+def flow_envs(fake: FakeGitlab, flow: str, artifacts: str) -> dict[str, str]:
+    envs = {
+        "CI_SERVER_PROTOCOL": "http",
+        "CI_SERVER_HOST": fake.host,
+        "CI_PROJECT_PATH": fake.project,
+        "GITFLOW_BOT_ID": "1",
+        "GITFLOW_BOT_TOKEN": "benchmark",
+        "GITFLOW_ARTIFACTS_DIR": artifacts,
+        "GITFLOW_TIMEWAIT": "1",
+        "GITFLOW_HTTP_RETRIES": "0",
+        "GITFLOW_LOG_LEVEL": "WARNING",
+    }
+    if flow == "support":
+        # the newest patch of the first line, so the incremented tag is free
+        line = [tag["name"] for tag in fake.tags if tag["name"].startswith("v1.0.")]
+        envs["GITFLOW_SOURCE_TAG"] = max(
+            line, key=lambda name: int(name.split(".")[-1])
+        )
+    return envs
+
+
+def run_flow(flow: str, args: argparse.Namespace, trace_memory: bool) -> dict:
+    from settings import config
+    from app.gitflow import Gitflow
+
+    fake = FakeGitlab(
+        tags=args.tags_count,
+        schedules=args.schedules,
+        mrs=args.mrs,
+        latency=args.latency / 1000,
+    )
+    with fake, tempfile.TemporaryDirectory() as tmp:
+        envs = flow_envs(fake, flow, os.path.join(tmp, "artifacts"))
+        with config.override(envs):
+            if trace_memory:
+                tracemalloc.start()
+            started = time.perf_counter()
+            gitflow = Gitflow()
+            getattr(gitflow, f"start_{flow}")()
+            getattr(gitflow, f"finish_{flow}")()
+            seconds = time.perf_counter() - started
+            peak = 0
+            if trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+    return {"seconds": seconds, "calls": fake.total_calls, "peak_kb": peak // 1024}
+
+
+def run_case(flow: str, args: argparse.Namespace) -> dict:
+    """Best time of the runs, memory from a separate traced run"""
+    runs = [run_flow(flow, args, trace_memory=False) for _ in range(args.runs)]
+    result = min(runs, key=lambda run: run["seconds"])
+    result["peak_kb"] = run_flow(flow, args, trace_memory=True)["peak_kb"]
+    return result
+
+
+def compare(result: dict, baseline: dict | None, tolerance: float) -> list[str]:
+    if baseline is None:
+        return []
+    regressions = []
+    if result["calls"] > baseline["calls"]:
+        regressions += [f"calls {baseline['calls']} -> {result['calls']}"]
+    for key in ("seconds", "peak_kb"):
+        if result[key] > baseline[key] * (1 + tolerance):
+            regressions += [f"{key} {baseline[key]:.3f} -> {result[key]:.3f}"]
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--tags", default="1000,10000", help="comma separated tag counts"
+    )
+    parser.add_argument("--schedules", type=int, default=100)
+    parser.add_argument("--mrs", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0, help="per request, ms")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=20.0, help="percent")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    baselines = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE, "r") as baseline_file:
+            baselines = json.load(baseline_file)
+    results = {}
+    failed = False
+    for tags in [int(count) for count in args.tags.split(",")]:
+        args.tags_count = tags
+        for flow in FLOWS:
+            name = f"{flow} tags={tags} latency={args.latency:g}ms"
+            try:
+                result = run_case(flow, args)
+            except Exception as e:
+                print(f"{name:<36} failed to run: {e!r}")
+                failed = True
+                continue
+            results[name] = result
+            regressions = compare(result, baselines.get(name), args.tolerance / 100)
+            print(
+                f"{name:<36} {result['seconds']:>8.3f} s {result['calls']:>6} calls"
+                f" {result['peak_kb']:>8} KiB"
+                + (f"  REGRESSION: {', '.join(regressions)}" if regressions else "")
+            )
+            failed = failed or bool(regressions)
+    if args.update_baseline:
+        baselines.update(results)
+        with open(BASELINE, "w") as baseline_file:
+            json.dump(baselines, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+        print(f"Baseline written to {BASELINE}")
+    elif not baselines:
+        print("No baseline yet, run with --update-baseline to store one")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
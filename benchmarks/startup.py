@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+CLI startup cost measured with `python -X importtime`.
+
+Every case runs in a fresh interpreter a few times and reports the best
+total import time and the slowest top-level imports. Cases that print help
+never touch the Gitlab API, command cases run the real command against an
+in-process fake Gitlab, so they import everything the command does.
+
+Usage: python benchmarks/startup.py [--runs N] [--max-ms MS]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+GITFLOW = os.path.join(ROOT, "gitflow")
+sys.path[:0] = [os.path.dirname(__file__)]
+
+from fake_gitlab import FakeGitlab  # noqa: E402
+from flows import flow_envs  # noqa: E402
+
+CASES = {
+    "gitflow --help": ["--help"],
+    "gitflow release --help": ["release", "--", "--help"],
+    "gitflow hotfix --help": ["hotfix", "--", "--help"],
+    "gitflow support --help": ["support", "--", "--help"],
+    "gitflow release start": ["release", "start"],
+    "gitflow hotfix start": ["hotfix", "start"],
+    "gitflow support start": ["support", "start"],
+    "gitflow gc --dry-run": ["gc", "--dry-run"],
+}
+
+
+def import_times(args: list[str], env: dict[str, str]) -> dict[str, int] | None:
+    env = dict(os.environ, **env, PAGER="cat", PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", GITFLOW, *args],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    if result.returncode != 0:
+        return None
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not name.startswith("  "):
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None)
+    args = parser.parse_args()
+    failed = False
+    with FakeGitlab(tags=100) as fake, tempfile.TemporaryDirectory() as tmp:
+        for name, case_args in CASES.items():
+            env = flow_envs(fake, case_args[0], os.path.join(tmp, "artifacts"))
+            runs = [import_times(case_args, env) for _ in range(args.runs)]
+            if None in runs:
+                print(f"{name:<32} failed to run")
+                failed = True
+                continue
+            best = min(runs, key=lambda times: sum(times.values()))
+            total_ms = sum(best.values()) / 1000
+            slowest = sorted(best.items(), key=lambda item: item[1], reverse=True)[:3]
+            top = ", ".join(f"{module} {us / 1000:.1f}ms" for module, us in slowest)
+            print(f"{name:<32} {total_ms:>8.1f} ms  ({top})")
+            if args.max_ms is not None and total_ms > args.max_ms:
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Tag parsing throughput: Tag.parse per tag vs Tag.parse_many.
+
+Usage: python benchmarks/tag_parse.py [number of tags]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+for env_name in ("CI_SERVER_PROTOCOL", "CI_SERVER_HOST", "CI_PROJECT_PATH"):
+    os.environ.setdefault(env_name, "bench")
+for env_name in ("GITFLOW_BOT_ID", "GITFLOW_BOT_TOKEN"):
+    os.environ.setdefault(env_name, "bench")
+
+from app.gitlab.tag import Tag  # noqa: E402
+
+
+def generate(count: int) -> list[tuple[str, str]]:
+    rnd = random.Random(0)
+    tags = []
+    for _ in range(count):
+        prefix = rnd.choice(("", "v", "release-"))
+        postfix = rnd.choice(("", "", "-rc", "-hotfix"))
+        version = f"{rnd.randint(0, 20)}.{rnd.randint(0, 99)}.{rnd.randint(0, 999)}"
+        tags += [(f"{prefix}{version}{postfix}", "2024-05-01T10:00:00.000+03:00")]
+    return tags
+
+
+def measure(name: str, func, count: int) -> None:
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<12} {count / elapsed:>14,.0f} tags/s  {elapsed * 1000:>9.1f} ms")
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    raw_tags = generate(count)
+    measure(
+        "parse",
+        lambda: [Tag.parse(name, timestamp) for name, timestamp in raw_tags],
+        count,
+    )
+    measure("parse_many", lambda: Tag.parse_many(raw_tags), count)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,297 @@
 from __future__ import annotations
 from app.helpers.common import DotDict
-from dotenv import load_dotenv
+import contextlib
+import contextvars
+import dataclasses
+import functools
+import logging
+import string
+import typing
+import json
 import os
+import re
 
+if typing.TYPE_CHECKING:
+    from settings import errors
 
+_CONFIG_FILE_ENV = "GITFLOW_CONFIG_FILE"
+_BOOLS = {"true": True, "false": False}
+
+
+class _Values:
+    """Raw env values of one config section, validated and converted by key"""
+
+    def __init__(self, section: str, values: dict[str, str | None]) -> None:
+        self.section = section
+        self.values = values
+
+    def _env_name(self, key: str) -> str:
+        return Config.env_names[self.section][key]
+
+    def fail(self, key: str, reason: str) -> errors.SettingsConfigError:
+        from settings import errors
+
+        return errors.SettingsConfigError(f"{self._env_name(key)}: {reason}")
+
+    def required(self, key: str) -> str:
+        value = self.values[key]
+        if value is None:
+            raise self.fail(key, "missing environment variable")
+        return value
+
+    def optional(self, key: str) -> str | None:
+        return self.values[key] or None
+
+    def integer(self, key: str) -> int:
+        try:
+            return int(self.required(key))
+        except ValueError:
+            raise self.fail(key, f"'{self.values[key]}' is not an integer") from None
+
+    def number(self, key: str) -> float:
+        try:
+            return float(self.required(key))
+        except ValueError:
+            raise self.fail(key, f"'{self.values[key]}' is not a number") from None
+
+    def flag(self, key: str) -> bool:
+        value = self.required(key).lower()
+        if value not in _BOOLS:
+            raise self.fail(key, f"'{self.values[key]}' is not 'true' or 'false'")
+        return _BOOLS[value]
+
+    def choice(self, key: str, choices: typing.Iterable[str]) -> str:
+        value = self.required(key)
+        if value not in choices:
+            raise self.fail(key, f"'{value}' is not one of {sorted(choices)}")
+        return value
+
+    def items(self, key: str) -> tuple[str, ...]:
+        return tuple(item for item in self.required(key).split(",") if item)
+
+    def pattern(self, key: str, groups: set[str]) -> re.Pattern:
+        try:
+            pattern = re.compile(self.required(key))
+        except re.error as e:
+            raise self.fail(key, f"invalid regexp: {e}") from None
+        missing = groups - pattern.groupindex.keys()
+        if missing:
+            raise self.fail(key, f"regexp lacks the groups {sorted(missing)}")
+        return pattern
+
+    def template(self, key: str, fields: set[str]) -> typing.Callable[..., str]:
+        """Validated once and returned as the bound str.format of the template"""
+        template = self.required(key)
+        try:
+            used = {
+                re.split(r"[.\[]", field)[0]
+                for _, field, _, _ in string.Formatter().parse(template)
+                if field is not None
+            }
+        except ValueError as e:
+            raise self.fail(key, f"invalid template: {e}") from None
+        if used - fields:
+            raise self.fail(
+                key, f"unknown fields {sorted(used - fields)}, use {sorted(fields)}"
+            )
+        return template.format
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class GitlabConfig:
+    proto: str
+    host: str
+    project: str
+    bot_id: str
+    bot_token: str
+    master_name: str
+    dev_name: str
+    timewait: int
+    timewait_max: int
+    timeout: int
+    get_all_tags: bool
+    concurrency: int
+    rate_limit: float
+    http_pool_size: int
+    http_retries: int
+    http_backoff: float
+    graphql: bool
+
+    @staticmethod
+    def load(values: _Values) -> GitlabConfig:
+        return GitlabConfig(
+            proto=values.required("proto"),
+            host=values.required("host"),
+            project=values.required("project"),
+            bot_id=values.required("bot_id"),
+            bot_token=values.required("bot_token"),
+            master_name=values.required("master_name"),
+            dev_name=values.required("dev_name"),
+            timewait=values.integer("timewait"),
+            timewait_max=values.integer("timewait_max"),
+            timeout=values.integer("timeout"),
+            get_all_tags=values.flag("get_all_tags"),
+            concurrency=values.integer("concurrency"),
+            rate_limit=values.number("rate_limit"),
+            http_pool_size=values.integer("http_pool_size"),
+            http_retries=values.integer("http_retries"),
+            http_backoff=values.number("http_backoff"),
+            graphql=values.flag("graphql"),
+        )
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class ArtifactsConfig:
+    dir: str
+    legacy_path: str | None
+
+    @staticmethod
+    def load(values: _Values) -> ArtifactsConfig:
+        return ArtifactsConfig(
+            dir=values.required("dir"),
+            legacy_path=values.optional("legacy_path"),
+        )
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class TagCacheConfig:
+    dir: str
+    max_age: int
+
+    @staticmethod
+    def load(values: _Values) -> TagCacheConfig:
+        return TagCacheConfig(
+            dir=values.required("dir"), max_age=values.integer("max_age")
+        )
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class WebhookConfig:
+    port: int | None
+    token: str
+
+    @staticmethod
+    def load(values: _Values) -> WebhookConfig:
+        port = None
+        if values.optional("port"):
+            port = values.integer("port")
+        return WebhookConfig(port=port, token=values.required("token"))
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class CassetteConfig:
+    path: str
+    mode: str
+    sleep_scale: float
+
+    @staticmethod
+    def load(values: _Values) -> CassetteConfig:
+        return CassetteConfig(
+            path=values.required("path"),
+            mode=values.choice("mode", {"", "record", "replay"}),
+            sleep_scale=values.number("sleep_scale"),
+        )
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class MetricsConfig:
+    enabled: bool
+
+    @staticmethod
+    def load(values: _Values) -> MetricsConfig:
+        return MetricsConfig(enabled=values.flag("enabled"))
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class TracingConfig:
+    path: str
+
+    @staticmethod
+    def load(values: _Values) -> TracingConfig:
+        return TracingConfig(path=values.required("path"))
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class LoggerConfig:
+    level: str
+    format: str
+
+    @staticmethod
+    def load(values: _Values) -> LoggerConfig:
+        level = values.required("level").upper()
+        if level not in logging.getLevelNamesMapping():
+            raise values.fail("level", f"invalid log level '{values.values['level']}'")
+        return LoggerConfig(
+            level=level, format=values.choice("format", {"text", "json"})
+        )
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class FlowConfig:
+    prefix: str
+    ref: str | None
+    schedule: str
+
+    @staticmethod
+    def load(values: _Values) -> FlowConfig:
+        return FlowConfig(
+            prefix=values.required("prefix"),
+            ref=values.required("ref") if "ref" in values.values else None,
+            schedule=values.required("schedule"),
+        )
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class TagConfig:
+    source: str | None
+    target: str | None
+    regexp: re.Pattern
+    semver_regexp: re.Pattern
+    format_message: typing.Callable[..., str]
+    exact_lookup: bool
+
+    @staticmethod
+    def load(values: _Values) -> TagConfig:
+        return TagConfig(
+            source=values.optional("source"),
+            target=values.optional("target"),
+            regexp=values.pattern("regexp", {"prefix", "version", "postfix"}),
+            semver_regexp=values.pattern("semver_regexp", {"major", "minor", "patch"}),
+            format_message=values.template("message_template", {"tag"}),
+            exact_lookup=values.flag("exact_lookup"),
+        )
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class MrConfig:
+    labels: tuple[str, ...]
+    format_title: typing.Callable[..., str]
+    format_msg: typing.Callable[..., str]
+    rm_source: bool
+    skip_ci: bool
+    squash: bool
+    auto_merge: bool
+    assignee: str
+    reviewers: tuple[str, ...]
+
+    @staticmethod
+    def load(values: _Values) -> MrConfig:
+        return MrConfig(
+            labels=values.items("labels"),
+            format_title=values.template("title_template", {"source", "target"}),
+            format_msg=values.template("msg_template", {"source", "target"}),
+            rm_source=values.flag("rm_source"),
+            skip_ci=values.flag("skip_ci"),
+            squash=values.flag("squash"),
+            auto_merge=values.flag("auto_merge"),
+            assignee=values.required("assignee"),
+            reviewers=values.items("reviewers"),
+        )
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
 class Config:
-    env_names = DotDict(
+    env_names: typing.ClassVar[DotDict] = DotDict(
         {
             "gitlab": DotDict(
                 {
@@ -17,18 +303,56 @@ class Config:
                     "master_name": "GITFLOW_MASTER_NAME",
                     "dev_name": "GITFLOW_DEV_NAME",
                     "timewait": "GITFLOW_TIMEWAIT",
+                    "timewait_max": "GITFLOW_TIMEWAIT_MAX",
                     "timeout": "GITFLOW_TIMEOUT",
                     "get_all_tags": "GITFLOW_GET_ALL_TAGS",
+                    "concurrency": "GITFLOW_CONCURRENCY",
+                    "rate_limit": "GITFLOW_RATE_LIMIT",
+                    "http_pool_size": "GITFLOW_HTTP_POOL_SIZE",
+                    "http_retries": "GITFLOW_HTTP_RETRIES",
+                    "http_backoff": "GITFLOW_HTTP_BACKOFF",
+                    "graphql": "GITFLOW_GRAPHQL",
                 }
             ),
             "artifacts": DotDict(
                 {
-                    "path": "GITFLOW_ARTIFACTS_PATH",
+                    "dir": "GITFLOW_ARTIFACTS_DIR",
+                    "legacy_path": "GITFLOW_ARTIFACTS_PATH",
+                }
+            ),
+            "tag_cache": DotDict(
+                {
+                    "dir": "GITFLOW_TAG_CACHE_DIR",
+                    "max_age": "GITFLOW_TAG_CACHE_MAX_AGE",
+                }
+            ),
+            "webhook": DotDict(
+                {
+                    "port": "GITFLOW_WEBHOOK_PORT",
+                    "token": "GITFLOW_WEBHOOK_TOKEN",
+                }
+            ),
+            "cassette": DotDict(
+                {
+                    "path": "GITFLOW_CASSETTE_PATH",
+                    "mode": "GITFLOW_CASSETTE_MODE",
+                    "sleep_scale": "GITFLOW_CASSETTE_SLEEP_SCALE",
+                }
+            ),
+            "metrics": DotDict(
+                {
+                    "enabled": "GITFLOW_METRICS",
+                }
+            ),
+            "tracing": DotDict(
+                {
+                    "path": "GITFLOW_TRACE_PATH",
                 }
             ),
             "logger": DotDict(
                 {
                     "level": "GITFLOW_LOG_LEVEL",
+                    "format": "GITFLOW_LOG_FORMAT",
                 }
             ),
             "release": DotDict(
@@ -58,6 +382,7 @@ class Config:
                     "regexp": "GITFLOW_TAG_REGEXP",
                     "semver_regexp": "GITFLOW_TAG_SEMVER_REGEXP",
                     "message_template": "GITFLOW_TAG_MESSAGE_TEMPLATE",
+                    "exact_lookup": "GITFLOW_TAG_EXACT_LOOKUP",
                 }
             ),
             "mr": DotDict(
@@ -68,6 +393,7 @@ class Config:
                     "rm_source": "GITFLOW_MR_RM_SOURCE",
                     "skip_ci": "GITFLOW_MR_SKIP_CI",
                     "squash": "GITFLOW_MR_SQUASH",
+                    "auto_merge": "GITFLOW_MR_AUTO_MERGE",
                     "assignee": "GITFLOW_MR_ASSIGNEE_ID",
                     "reviewers": "GITFLOW_MR_REVIEWER_IDS",
                 }
@@ -75,50 +401,146 @@ class Config:
         }
     )
 
-    optional = [
-        env_names.tag.source,
-        env_names.tag.target,
-    ]
-
-    def __init__(self):
-        load_dotenv()
-        self.gitlab = self.load_envs("gitlab")
-        get_all = False
-        if self.gitlab.get_all_tags == "true":
-            get_all = True
-        self.gitlab.get_all_tags = get_all
-        self.gitlab.timewait = int(self.gitlab.timewait)
-        self.gitlab.timeout = int(self.gitlab.timeout)
-        self.artifacts = self.load_envs("artifacts")
-        self.logger = self.load_envs("logger")
-        self.release = self.load_envs("release")
-        self.hotfix = self.load_envs("hotfix")
-        self.support = self.load_envs("support")
-        self.tag = self.load_envs("tag")
-        self.mr = self.load_envs("mr")
-        self.mr.reviewers = self.mr.reviewers.split(",")
-        self.mr.labels = self.mr.labels.split(",")
-
-    @classmethod
-    def load_envs(cls, envs_name: str) -> DotDict:
-        result = DotDict()
-        for key, value in cls.env_names[envs_name].items():
-            result[key] = cls.load_env(env_name=value)
-        return result
-
-    @classmethod
-    def load_env(cls, env_name: str) -> str:
-        if env_name in cls.optional:
-            return os.getenv(env_name, None)
-        return os.environ[env_name]
-
-
-init = Config()
-logger = init.logger
-gitlab = init.gitlab
-artifacts = init.artifacts
-release = init.release
-hotfix = init.hotfix
-support = init.support
-tag = init.tag
-mr = init.mr
+    _loaders: typing.ClassVar[dict[str, typing.Callable[[_Values], typing.Any]]] = {
+        "gitlab": GitlabConfig.load,
+        "artifacts": ArtifactsConfig.load,
+        "tag_cache": TagCacheConfig.load,
+        "webhook": WebhookConfig.load,
+        "cassette": CassetteConfig.load,
+        "metrics": MetricsConfig.load,
+        "tracing": TracingConfig.load,
+        "logger": LoggerConfig.load,
+        "release": FlowConfig.load,
+        "hotfix": FlowConfig.load,
+        "support": FlowConfig.load,
+        "tag": TagConfig.load,
+        "mr": MrConfig.load,
+    }
+
+    logger: LoggerConfig
+    gitlab: GitlabConfig
+    artifacts: ArtifactsConfig
+    tag_cache: TagCacheConfig
+    webhook: WebhookConfig
+    cassette: CassetteConfig
+    metrics: MetricsConfig
+    tracing: TracingConfig
+    release: FlowConfig
+    hotfix: FlowConfig
+    support: FlowConfig
+    tag: TagConfig
+    mr: MrConfig
+
+    @staticmethod
+    def load(overrides: dict[str, str] | None = None) -> Config:
+        """
+        Validates and converts every section once. The environment is read
+        once per process, and sections with the same raw values are shared
+        between configs, so per-project configs of a batch only convert what
+        their overrides change.
+        """
+        environment = _environment()
+        project_name = Config.env_names.gitlab.project
+        project = (overrides or {}).get(project_name, environment.get(project_name))
+        values = {
+            **environment,
+            **_config_file().get("projects", {}).get(project, {}),
+            **(overrides or {}),
+        }
+        return Config(
+            **{
+                section: _section(
+                    section,
+                    tuple(
+                        (key, values.get(env_name))
+                        for key, env_name in env_names.items()
+                    ),
+                )
+                for section, env_names in Config.env_names.items()
+            }
+        )
+
+
+@functools.cache
+def _section(section: str, raw: tuple[tuple[str, str | None], ...]) -> typing.Any:
+    return Config._loaders[section](_Values(section, dict(raw)))
+
+
+@functools.cache
+def _config_file() -> dict:
+    """
+    Optional JSON config file from GITFLOW_CONFIG_FILE with env defaults and
+    per-project overrides:
+    {
+        "env": {"GITFLOW_MR_SQUASH": "true"},
+        "projects": {"group/a": {"GITFLOW_TARGET_TAG": "v2.0.0"}}
+    }
+    """
+    from dotenv import dotenv_values
+    from settings import errors
+
+    path = os.getenv(_CONFIG_FILE_ENV) or dotenv_values().get(_CONFIG_FILE_ENV)
+    if not path:
+        return {}
+    try:
+        with open(path, "r") as config_file:
+            config = json.load(config_file)
+        return {
+            "env": {key: str(value) for key, value in config.get("env", {}).items()},
+            "projects": {
+                project: {key: str(value) for key, value in envs.items()}
+                for project, envs in config.get("projects", {}).items()
+            },
+        }
+    except Exception as e:
+        raise errors.SettingsConfigError(f"Failed to read config file '{path}'") from e
+
+
+@functools.cache
+def _environment() -> dict[str, str]:
+    """.env values, config file defaults and the environment, in rising priority"""
+    from dotenv import dotenv_values
+
+    return {
+        **{key: value for key, value in dotenv_values().items() if value is not None},
+        **_config_file().get("env", {}),
+        **os.environ,
+    }
+
+
+_sections = tuple(Config.env_names.keys())
+
+
+_default: Config | None = None
+_active: contextvars.ContextVar[Config | None] = contextvars.ContextVar(
+    "config", default=None
+)
+
+
+def __getattr__(name: str):
+    """
+    Resolves config sections of the active config, which is loaded from the
+    environment on first access unless overridden for the current context
+    """
+    global _default
+    if name != "init" and name not in _sections:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    active = _active.get()
+    if active is None:
+        if _default is None:
+            _default = Config.load()
+        active = _default
+    if name == "init":
+        return active
+    return getattr(active, name)
+
+
+@contextlib.contextmanager
+def override(envs: dict[str, str]) -> typing.Iterator[Config]:
+    """Replaces the given env variables for the current context only"""
+    active = Config.load(overrides=envs)
+    token = _active.set(active)
+    try:
+        yield active
+    finally:
+        _active.reset(token)
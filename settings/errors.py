@@ -18,6 +18,10 @@ def error_handler(func: typing.Callable) -> typing.Callable:
             log.debug(traceback.format_exc())
             log.error(f"Missing environment variable exception: {e}")
             sys.exit(1)
+        except SettingsConfigError as e:
+            log.debug(traceback.format_exc())
+            log.error(f"Config exception: {e}")
+            sys.exit(1)
         except GitflowError as e:
             log.debug(traceback.format_exc())
             log.error(f"Gitflow exception: {e}")
@@ -42,6 +46,10 @@ def error_handler(func: typing.Callable) -> typing.Callable:
             log.debug(traceback.format_exc())
             log.error(f"Gitlab tag exception: {e}")
             sys.exit(1)
+        except GitlabCassetteError as e:
+            log.debug(traceback.format_exc())
+            log.error(f"Gitlab cassette exception: {e}")
+            sys.exit(1)
 
         except Exception as e:
             log.debug(traceback.format_exc())
@@ -75,6 +83,12 @@ class HelpersCommonError(Exception):
     pass
 
 
+class HelpersCacheError(Exception):
+    """Exception raised for errors in the cache helper"""
+
+    pass
+
+
 class SettingsConfigError(Exception):
     """Exception raised for errors in the config"""
 
@@ -127,3 +141,9 @@ class GitlabTagError(Exception):
     """Exception raised for errors in the tags"""
 
     pass
+
+
+class GitlabCassetteError(Exception):
+    """Exception raised for errors in the record and replay transport"""
+
+    pass
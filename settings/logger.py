@@ -1,7 +1,15 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import threading
 import settings.config as config
 
-_log_format = "%(color)s%(asctime)s : %(levelname)s : <%(filename)s:%(funcName)s:%(lineno)d> : %(message)s"
+_log_format = (
+    "%(color)s%(asctime)s : %(levelname)s : <%(filename)s:%(funcName)s:%(lineno)d>"
+    " : %(message)s%(url_suffix)s"
+)
 _time_format = "%Y-%m-%dT%H:%M:%S%z"
 
 
@@ -17,27 +25,113 @@ class CustomFilter(logging.Filter):
 
     def filter(self, record):
         record.color = CustomFilter.COLOR[record.levelname]
+        record.url_suffix = f" : {record.url}" if getattr(record, "url", None) else ""
         return True
 
 
+class StepFilter(logging.Filter):
+    """Captures the metrics step in the logging thread, the listener has no context"""
+
+    def filter(self, record):
+        from app.helpers import metrics
+
+        record.step = metrics.current_step()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with step, url and duration fields"""
+
+    def format(self, record):
+        line = {
+            "time": self.formatTime(record, _time_format),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "step": getattr(record, "step", "") or None,
+            "url": getattr(record, "url", None),
+            "duration": getattr(record, "duration", None),
+        }
+        return json.dumps(line)
+
+
 class UrlAdapter(logging.LoggerAdapter):
+    def isEnabledFor(self, level):
+        if self.logger.level == logging.NOTSET:
+            self.logger.setLevel(_get_level())
+        return super().isEnabledFor(level)
+
     def process(self, msg, kwargs):
         url = kwargs.pop("url", self.extra["url"])
-        if not url:
-            return "%s" % msg, kwargs
-        return "%s : %s" % (msg, url), kwargs
+        kwargs["extra"] = {**kwargs.get("extra", {}), "url": url}
+        return msg, kwargs
+
+
+def _logger_config() -> config.LoggerConfig:
+    """Falls back to INFO text logs on an invalid config, so its error is still logged"""
+    from settings import errors
+
+    try:
+        return config.logger
+    except errors.SettingsConfigError:
+        return config.LoggerConfig(level="INFO", format="text")
+
+
+def _get_level() -> int:
+    logger_config = _logger_config()
+    numeric_level = getattr(logging, logger_config.level.upper(), None)
+    if not isinstance(numeric_level, int):
+        raise ValueError(f"Invalid log level: {logger_config.level}")
+    return numeric_level
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    The one logging pipeline: loggers put records on a queue and a listener
+    thread formats and writes them, so log I/O stays off the calling threads.
+    The listener starts with the first record, so importing reads no config,
+    and is flushed at exit. Threads logging the first records at once start
+    it only once.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(queue.SimpleQueue())
+        self.addFilter(StepFilter())
+        self._listener: logging.handlers.QueueListener | None = None
+        self._start_lock = threading.Lock()
+
+    def enqueue(self, record):
+        if self._listener is None:
+            with self._start_lock:
+                if self._listener is None:
+                    self._start()
+        super().enqueue(record)
+
+    def _start(self) -> None:
+        handler = logging.StreamHandler()
+        match _logger_config().format:
+            case "json":
+                handler.setFormatter(JsonFormatter())
+            case "text":
+                handler.addFilter(CustomFilter())
+                handler.setFormatter(
+                    logging.Formatter(fmt=_log_format, datefmt=_time_format)
+                )
+            case log_format:
+                raise ValueError(f"Invalid log format: {log_format}")
+        self._listener = logging.handlers.QueueListener(self.queue, handler)
+        self._listener.start()
+        atexit.register(self._listener.stop)
+
+
+_handler = _QueueHandler()
 
 
 def get_logger(name):
+    """Level is set from the config on the first log call, not at import"""
     logger = logging.getLogger(name)
-    numeric_level = getattr(logging, config.logger.level.upper(), None)
-    if not isinstance(numeric_level, int):
-        raise ValueError(f"Invalid log level: {config.logger.level}")
-    logger.setLevel(numeric_level)
-    handler = logging.StreamHandler()
-    formatter = logging.Formatter(fmt=_log_format, datefmt=_time_format)
-    logger.addFilter(CustomFilter())
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+    logger.propagate = False
+    if _handler not in logger.handlers:
+        logger.addHandler(_handler)
     logger = UrlAdapter(logger, {"url": None})
     return logger